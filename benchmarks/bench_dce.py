@@ -0,0 +1,58 @@
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from code_generator import Instruction
+from operands import Const, Temp, Var
+from optimizer import Optimizer
+
+
+def gerar_programa(n_blocos):
+    """
+    Código intermediário sintético no formato do CodeGenerator:
+    cada bloco atribui um literal a uma variável e soma com a anterior;
+    só uma a cada dez somas chega a um WRITE
+    """
+    instrucoes = []
+    temp = 0
+    for i in range(n_blocos):
+        temp += 1
+        instrucoes.append(Instruction("MOV", Temp(f"TEMP{temp}"), Const(i)))
+        instrucoes.append(Instruction("MOV", Var(f"v{i}"), Temp(f"TEMP{temp}")))
+        if i > 0:
+            temp += 1
+            instrucoes.append(
+                Instruction("ADD", Temp(f"TEMP{temp}"), Var(f"v{i}"), Var(f"v{i - 1}"))
+            )
+            instrucoes.append(Instruction("MOV", Var(f"s{i}"), Temp(f"TEMP{temp}")))
+            if i % 10 == 0:
+                instrucoes.append(Instruction("WRITE", Var(f"s{i}")))
+    return instrucoes
+
+
+def medir(instrucoes, repeticoes=5):
+    otimizador = Optimizer()
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        otimizador.eliminar_codigo_morto(instrucoes)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main():
+    print(f"{'Instruções':>12} {'Tempo (ms)':>12} {'ns/instrução':>14}")
+    print("-" * 40)
+    for n_blocos in (1_000, 4_000, 16_000, 64_000):
+        instrucoes = gerar_programa(n_blocos)
+        tempo = medir(instrucoes)
+        print(
+            f"{len(instrucoes):>12} {tempo * 1e3:>12.2f} "
+            f"{tempo * 1e9 / len(instrucoes):>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import sys
+import os
+import gc
+import io
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from lexer import BufferTokens, obter_lexer, tokenize
+from parser import obter_tabelas, parse
+from scanner import TIPOS, BufferVarredura, varrer
+
+
+def gerar_programa(n_funcoes, comandos=20):
+    """
+    Programa com n_funcoes funções de atribuições, if/else, while, write,
+    strings e comentários, mais um programa principal que chama todas
+    """
+    linhas = ["program bench_scanner;", "var", "    r, i : integer;"]
+    for f in range(n_funcoes):
+        linhas += [
+            f"function f{f}(n : integer) : integer",
+            "var",
+            "    a, b : integer;",
+            "    x : real;",
+            "begin",
+            "    { corpo gerado }",
+            "    a := n;",
+            "    b := 0;",
+        ]
+        for j in range(comandos):
+            linhas += [
+                f"    a := a + {j} * n;",
+                f"    x := a / 2.5 + .{j};",
+                f"    if a > {j * 7} then",
+                "    begin",
+                "        b := b + a",
+                "    end",
+                "    else",
+                "    begin",
+                '        write("negativo")',
+                "    end;",
+                "    while b < n",
+                "    begin",
+                "        b := b * 2 - 1",
+                "    end;",
+            ]
+        linhas += [f"    f{f} := a + b", "end;"]
+    linhas.append("begin")
+    linhas += [f"    r := f{f}(i);" for f in range(n_funcoes)]
+    linhas += ["    write(r)", "end"]
+    return "\n".join(linhas) + "\n"
+
+
+def medir(executar, repeticoes=5):
+    # Sem o coletor de ciclos, que dispara em pontos diferentes em cada
+    # rodada e domina a variação entre elas
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        gc.collect()
+        gc.disable()
+        try:
+            with redirect_stdout(io.StringIO()):
+                inicio = time.perf_counter()
+                executar()
+                melhor = min(melhor, time.perf_counter() - inicio)
+        finally:
+            gc.enable()
+    return melhor
+
+
+def main():
+    obter_lexer()
+    obter_tabelas()
+
+    print(
+        f"{'Funções':>8} {'Tokens':>9} {'Etapa':>12} {'PLY (ms)':>10} "
+        f"{'rápido (ms)':>12} {'Ganho':>7}"
+    )
+    print("-" * 63)
+    for n_funcoes in (10, 50, 200):
+        fonte = gerar_programa(n_funcoes)
+
+        esperado = [(t.type, t.value, t.lineno, t.lexpos) for t in tokenize(fonte)]
+        obtido = [(TIPOS[t], v, l, p) for t, v, l, p, _ in varrer(fonte)]
+        assert obtido == esperado
+
+        etapas = (
+            ("léxico", lambda: tokenize(fonte), lambda: list(varrer(fonte))),
+            (
+                "léxico+parse",
+                lambda: parse(fonte, tokens=BufferTokens(fonte)),
+                lambda: parse(fonte, tokens=BufferVarredura(fonte)),
+            ),
+        )
+        for etapa, ply, rapido in etapas:
+            antes = medir(ply)
+            depois = medir(rapido)
+            print(
+                f"{n_funcoes:>8} {len(esperado):>9} {etapa:>12} "
+                f"{antes * 1e3:>10.1f} {depois * 1e3:>12.1f} "
+                f"{antes / depois:>6.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
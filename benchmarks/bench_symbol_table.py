@@ -0,0 +1,59 @@
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from symbol_table import SymbolTable
+
+
+def simular_analise(n_funcoes, locais=8):
+    """
+    Mesma sequência de operações que o SemanticAnalyzer faz em um programa
+    com n_funcoes funções: cada função declara parâmetros e locais que
+    sombreiam globais, consulta nomes locais, globais e outras funções, e no
+    fim o escopo de cada função é listado (como faz a máquina virtual)
+    """
+    tabela = SymbolTable()
+    tabela.adicionar("programa", "programa", "void")
+    for j in range(locais):
+        tabela.adicionar(f"x{j}", "variavel", "integer")
+
+    for i in range(n_funcoes):
+        nome = f"f{i}"
+        tabela.adicionar(nome, "funcao", "integer", tipo_retorno="integer")
+        tabela.entrar_escopo(nome)
+        tabela.adicionar("a", "parametro", "integer", ordem=1)
+        for j in range(locais):
+            if not tabela.existe_no_escopo_atual(f"x{j}"):
+                tabela.adicionar(f"x{j}", "variavel", "integer")
+        for j in range(locais):
+            tabela.buscar(f"x{j}")
+            tabela.buscar("a")
+            tabela.buscar(nome)
+            tabela.buscar(f"f{i // 2}")
+        tabela.sair_escopo()
+
+    for i in range(n_funcoes):
+        tabela.obter_todos_no_escopo(f"f{i}")
+
+    return tabela
+
+
+def main():
+    print(f"{'Funções':>10} {'Tempo (ms)':>12} {'µs/função':>12}")
+    print("-" * 36)
+    for n_funcoes in (1_250, 2_500, 5_000, 10_000):
+        melhor = float("inf")
+        for _ in range(3):
+            inicio = time.perf_counter()
+            simular_analise(n_funcoes)
+            melhor = min(melhor, time.perf_counter() - inicio)
+        print(
+            f"{n_funcoes:>10} {melhor * 1e3:>12.2f} "
+            f"{melhor * 1e6 / n_funcoes:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
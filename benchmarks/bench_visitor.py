@@ -0,0 +1,157 @@
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ast_nodes import (
+    ETIQUETAS,
+    Atribuicao,
+    ChamadaFuncao,
+    Corpo,
+    DefVar,
+    Else,
+    Funcao,
+    Identificador,
+    If,
+    No,
+    Numero,
+    OpArit,
+    OpComp,
+    Parametro,
+    Programa,
+    Variavel,
+    While,
+    Write,
+)
+from code_generator import CodeGenerator
+from semantic import SemanticAnalyzer
+
+NOMES = {etiqueta: nome for nome, etiqueta in ETIQUETAS.items()}
+
+
+class AnalisadorPorNome(SemanticAnalyzer):
+    """
+    Despacho anterior: monta o nome do método e chama getattr a cada nó
+    """
+
+    def visitar(self, no):
+        if no is None:
+            return None
+        if isinstance(no, No):
+            metodo = f"visitar_{NOMES[no.tag].lower()}"
+            if hasattr(self, metodo):
+                return getattr(self, metodo)(no)
+            for filho in no.filhos():
+                self.visitar(filho)
+            return None
+        elif isinstance(no, list):
+            for item in no:
+                self.visitar(item)
+            return None
+        return no
+
+
+class GeradorPorNome(CodeGenerator):
+    def visitar(self, no):
+        if no is None:
+            return None
+        if isinstance(no, No):
+            metodo = f"gerar_{NOMES[no.tag].lower()}"
+            if hasattr(self, metodo):
+                return getattr(self, metodo)(no)
+            for filho in no.filhos():
+                self.visitar(filho)
+            return None
+        elif isinstance(no, list):
+            resultado = None
+            for item in no:
+                resultado = self.visitar(item)
+            return resultado
+        return no
+
+
+def gerar_ast(n_funcoes, comandos=20):
+    """
+    AST sintética no formato do parser: n_funcoes funções com atribuições,
+    if, while e write, mais um programa principal que chama todas
+    """
+    x = Identificador("x")
+    n = Identificador("n")
+
+    funcoes = []
+    for i in range(n_funcoes):
+        corpo = []
+        for j in range(comandos):
+            corpo.append(Atribuicao(x, OpArit("+", x, Numero(j))))
+            corpo.append(
+                If(
+                    OpComp(">", x, n),
+                    [Write(x)],
+                    Else([Atribuicao(x, Numero(0))]),
+                )
+            )
+            corpo.append(
+                While(
+                    OpComp("<", x, n),
+                    [Atribuicao(x, OpArit("*", x, Numero(2)))],
+                )
+            )
+        corpo.append(Atribuicao(Identificador(f"f{i}"), x))
+        funcoes.append(
+            Funcao(
+                f"f{i}",
+                [Parametro(["n"], "integer")],
+                "integer",
+                DefVar([Variavel(["x"], "integer")]),
+                corpo,
+            )
+        )
+
+    r = Identificador("r")
+    principal = [
+        Atribuicao(r, ChamadaFuncao(f"f{i}", [Numero(i)])) for i in range(n_funcoes)
+    ]
+    principal.append(Write(r))
+    corpo = Corpo(
+        None,
+        None,
+        DefVar([Variavel(["r"], "integer")]),
+        funcoes,
+        principal,
+    )
+    return Programa("bench", corpo)
+
+
+def medir(executar, repeticoes=3):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        executar()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main():
+    print(
+        f"{'Funções':>8} {'Etapa':>10} {'getattr (ms)':>13} "
+        f"{'tabela (ms)':>12} {'Ganho':>7}"
+    )
+    print("-" * 54)
+    for n_funcoes in (250, 1_000, 4_000):
+        ast = gerar_ast(n_funcoes)
+        etapas = (
+            ("semântica", AnalisadorPorNome, SemanticAnalyzer, "analisar"),
+            ("geração", GeradorPorNome, CodeGenerator, "gerar"),
+        )
+        for etapa, antiga, nova, metodo in etapas:
+            antes = medir(lambda: getattr(antiga(), metodo)(ast))
+            depois = medir(lambda: getattr(nova(), metodo)(ast))
+            print(
+                f"{n_funcoes:>8} {etapa:>10} {antes * 1e3:>13.2f} "
+                f"{depois * 1e3:>12.2f} {antes / depois:>6.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
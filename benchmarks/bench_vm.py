@@ -0,0 +1,67 @@
+import sys
+import os
+import io
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from parser import parse
+from semantic import SemanticAnalyzer
+from code_generator import CodeGenerator
+from optimizer import Optimizer
+from vm import VM, Programa
+
+
+PROGRAMA = """
+program bench_vm;
+var
+    i, j, n, m, s, k : integer;
+begin
+    n := 300;
+    m := 200;
+    i := 0;
+    s := 0;
+    while i < n
+    begin
+        j := 0;
+        while j < m
+        begin
+            k := n * m;
+            s := s + k;
+            j := j + 1
+        end;
+        i := i + 1
+    end;
+    write(s)
+end
+"""
+
+
+def medir(instrucoes, tabela):
+    programa = Programa(instrucoes, tabela)
+    vm = VM(saida=io.StringIO())
+    inicio = time.perf_counter()
+    vm.executar(programa)
+    return vm.executadas, time.perf_counter() - inicio, vm.saida.getvalue().strip()
+
+
+def main():
+    ast = parse(PROGRAMA)
+    analisador = SemanticAnalyzer()
+    analisador.analisar(ast)
+    instrucoes = CodeGenerator().gerar(ast)
+    otimizado = Optimizer().otimizar(instrucoes)
+
+    print()
+    print(f"{'Código':<15} {'Estático':>10} {'Executadas':>12} {'Tempo (ms)':>12} {'Saída':>10}")
+    print("-" * 63)
+    for nome, codigo in (("original", instrucoes), ("otimizado", otimizado)):
+        executadas, tempo, saida = medir(codigo, analisador.tabela)
+        print(
+            f"{nome:<15} {len(codigo):>10} {executadas:>12} "
+            f"{tempo * 1e3:>12.1f} {saida:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
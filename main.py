@@ -1,17 +1,109 @@
 import sys
 import os
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from itertools import chain, repeat
 from pathlib import Path
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
 
-from lexer import lexer, print_tokens
-from parser import parse_file
-from semantic import analisar_semantica
-from code_generator import gerar_codigo_intermediario
-from optimizer import otimizar_codigo
+from lexer import BufferTokens, obter_lexer, print_tokens, tokens_arquivo
+from parser import obter_tabelas, parse_file
+from ast_nodes import NO, achatar_arvore
+from cache import CacheCompilacao
+from scanner import BufferVarredura, imprimir_tokens, varrer_arquivo
+from profiler import FORMATOS, Perfil
 
 
-def analisar_arquivo(caminho_arquivo, modo="completo"):
+# As etapas depois da análise sintática (semantic, code_generator,
+# optimizer, vm) são importadas só nos modos que as usam: -l e -s não pagam
+# pela importação delas
+
+
+def _analisar_semantica(ast, verbose, fonte=None):
+    from semantic import analisar_semantica
+
+    sucesso, analisador = analisar_semantica(ast, verbose=verbose, fonte=fonte)
+    return sucesso, analisador.tabela
+
+
+def _cabecalho_lexico(caminho_arquivo):
+    print("=" * 70)
+    print(f"ANÁLISE LÉXICA: {caminho_arquivo}")
+    print("=" * 70)
+    print()
+
+
+def _rodape_lexico():
+    print()
+    print("=" * 70)
+    print("Análise léxica concluída!")
+    print("=" * 70)
+    print()
+
+
+SCANNERS = ("ply", "rapido")
+
+
+def listar_tokens_arquivo(caminho_arquivo, scanner="ply"):
+    """
+    Modo léxico: lista os tokens lendo o arquivo em trechos (ver
+    lexer.tokens_arquivo), com memória constante mesmo para arquivos de
+    centenas de megabytes; por isso não passa pelo cache de compilação
+    """
+    if scanner == "rapido":
+        tokens = varrer_arquivo(caminho_arquivo)
+        imprimir = imprimir_tokens
+    else:
+        tokens = tokens_arquivo(caminho_arquivo)
+        imprimir = print_tokens
+    try:
+        primeiro = next(tokens, None)
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"Erro ao ler o arquivo: {e}")
+        return False
+
+    _cabecalho_lexico(caminho_arquivo)
+    try:
+        imprimir(chain([primeiro] if primeiro is not None else [], tokens))
+    except UnicodeDecodeError as e:
+        print(f"Erro ao ler o arquivo: {e}")
+        return False
+    _rodape_lexico()
+    return True
+
+
+def analisar_arquivo(
+    caminho_arquivo, modo="completo", usar_cache=True, scanner="ply", perfil=None
+):
+    """
+    Analisa um arquivo no modo dado; com perfil ("tabela" ou "json"), mede
+    cada etapa (ver profiler.Perfil) e imprime o relatório na saída de erro
+    """
+    medidor = Perfil(ativo=perfil is not None)
+    try:
+        return _analisar(caminho_arquivo, modo, usar_cache, scanner, medidor)
+    finally:
+        medidor.encerrar()
+        medidor.imprimir(caminho_arquivo, perfil)
+
+
+def _ler_tokens(codigo, scanner):
+    if scanner == "rapido":
+        return BufferVarredura(codigo)
+    return BufferTokens(codigo)
+
+
+def _contar_tokens(buffer):
+    return sum(1 for item in buffer.itens if not isinstance(item, str))
+
+
+def _contar_nos(ast):
+    return sum(1 for operacao in achatar_arvore(ast) if operacao[0] == NO)
+
+
+def _analisar(caminho_arquivo, modo, usar_cache, scanner, perfil):
     if not os.path.exists(caminho_arquivo):
         print(f"Erro: Arquivo '{caminho_arquivo}' não encontrado.")
         return False
@@ -19,77 +111,149 @@ def analisar_arquivo(caminho_arquivo, modo="completo"):
     if not caminho_arquivo.endswith(".sp"):
         print(f"Aviso: O arquivo '{caminho_arquivo}' não possui extensão .sp")
 
+    if perfil.ativo:
+        # Tabelas do lexer e do parser, montadas uma vez por processo; fora
+        # daqui elas contariam como custo da primeira etapa que as usa
+        with perfil.etapa("preparacao"):
+            obter_lexer()
+            obter_tabelas()
+
+    if modo == "lexico":
+        with perfil.etapa("lexico"):
+            return listar_tokens_arquivo(caminho_arquivo, scanner)
+
     try:
-        with open(caminho_arquivo, "r", encoding="utf-8") as arquivo:
-            codigo = arquivo.read()
+        with perfil.etapa("leitura"):
+            with open(caminho_arquivo, "r", encoding="utf-8") as arquivo:
+                codigo = arquivo.read()
     except Exception as e:
         print(f"Erro ao ler o arquivo: {e}")
         return False
 
     sucesso = True
     ast = None
-
-    if modo in ["lexico", "completo"]:
-        print("=" * 70)
-        print(f"ANÁLISE LÉXICA: {caminho_arquivo}")
-        print("=" * 70)
-        print()
-
-        print_tokens(codigo)
-
-        print()
-        print("=" * 70)
-        print("Análise léxica concluída!")
-        print("=" * 70)
-        print()
-
-    if modo in ["sintatico", "semantico", "codinter", "otimizado", "completo"]:
-        ast = parse_file(caminho_arquivo)
+    tokens = None
+    fragmentos = None
+    cache = CacheCompilacao(caminho_arquivo, codigo, ativo=usar_cache)
+    # Em -run, as análises só imprimem erros: a saída é a do programa e o
+    # resumo da máquina virtual
+    verbose = modo != "executar"
+
+    def executar_etapa(etapa, calcular, *parametros):
+        with perfil.etapa(etapa):
+            resultado = cache.executar(etapa, calcular, *parametros)
+        perfil.contar("etapas_do_cache", cache.acertos)
+        return resultado
+
+    def listar_tokens():
+        # O buffer é reaproveitado pelo parser logo abaixo
+        nonlocal tokens
+        tokens = _ler_tokens(codigo, scanner)
+        if scanner == "rapido":
+            imprimir_tokens(tokens.tokens())
+        else:
+            print_tokens(tokens)
+
+    def analisar_sintaxe():
+        buffer = tokens
+        if buffer is None and scanner == "rapido":
+            buffer = BufferVarredura(codigo)
+        return parse_file(caminho_arquivo, codigo, buffer, verbose)
+
+    if modo == "completo":
+        _cabecalho_lexico(caminho_arquivo)
+        executar_etapa("lexico", listar_tokens)
+        _rodape_lexico()
+    elif perfil.ativo:
+        # Medido à parte da análise sintática, que consome o buffer
+        with perfil.etapa("lexico"):
+            tokens = _ler_tokens(codigo, scanner)
+    if tokens is not None:
+        perfil.contar("tokens", _contar_tokens(tokens))
+
+    if modo in ["sintatico", "semantico", "codinter", "otimizado", "completo", "executar"]:
+        ast = executar_etapa("sintatico", analisar_sintaxe, verbose)
         sucesso = ast is not None
+        if sucesso and perfil.ativo:
+            perfil.contar("nos", _contar_nos(ast))
 
         if not sucesso:
             print("\nAnálise sintática falhou. Não é possível prosseguir.")
             return False
 
-    if modo in ["semantico", "codinter", "otimizado", "completo"] and ast:
-        print("\n" + "=" * 70)
-        print(f"ANÁLISE SEMÂNTICA: {caminho_arquivo}")
-        print("=" * 70)
-        print()
+    if modo in ["semantico", "codinter", "otimizado", "completo", "executar"] and ast:
+        from incremental import Fragmentos
 
-        sucesso_semantico, analisador = analisar_semantica(ast, verbose=True)
-        sucesso = sucesso and sucesso_semantico
+        if verbose:
+            print("\n" + "=" * 70)
+            print(f"ANÁLISE SEMÂNTICA: {caminho_arquivo}")
+            print("=" * 70)
+            print()
 
-        print()
-        print("=" * 70)
-        if sucesso_semantico:
-            print("Análise semântica concluída com sucesso!")
-        else:
-            print("Análise semântica falhou!")
-        print("=" * 70)
-        print()
+        sucesso_semantico, tabela = executar_etapa(
+            "semantico", lambda: _analisar_semantica(ast, verbose, codigo), verbose
+        )
+        sucesso = sucesso and sucesso_semantico
+        perfil.contar("simbolos", sum(map(len, tabela.tabelas.values())))
+        fragmentos = (
+            Fragmentos(cache, tabela, ast, codigo) if usar_cache else None
+        )
 
-        if not sucesso_semantico and modo in ["codinter", "otimizado", "completo"]:
+        if verbose:
+            print()
+            print("=" * 70)
+            if sucesso_semantico:
+                print("Análise semântica concluída com sucesso!")
+            else:
+                print("Análise semântica falhou!")
+            print("=" * 70)
+            print()
+
+        if not sucesso_semantico and modo in [
+            "codinter",
+            "otimizado",
+            "completo",
+            "executar",
+        ]:
             print(
                 "\nAnálise semântica falhou. Não é possível gerar código intermediário."
             )
             return False
 
     if modo in ["codinter"] and ast:
-        instrucoes, gerador = gerar_codigo_intermediario(ast, verbose=True)
+        from code_generator import gerar_codigo_intermediario
+
+        instrucoes = executar_etapa(
+            "codinter",
+            lambda: gerar_codigo_intermediario(
+                ast, verbose=True, fragmentos=fragmentos
+            )[0],
+            True,
+        )
 
+        perfil.contar("instrucoes", len(instrucoes))
         if instrucoes:
             print("\nCódigo intermediário gerado com sucesso (SEM otimização)!")
         else:
             print("\nNenhum código intermediário foi gerado")
 
     if modo in ["otimizado", "completo"] and ast:
+        from code_generator import gerar_codigo_intermediario
+        from optimizer import otimizar_codigo
+
         print("\n" + "=" * 70)
         print("GERAÇÃO DE CÓDIGO INTERMEDIÁRIO")
         print("=" * 70)
 
-        instrucoes, gerador = gerar_codigo_intermediario(ast, verbose=False)
+        instrucoes = executar_etapa(
+            "codinter",
+            lambda: gerar_codigo_intermediario(
+                ast, verbose=False, fragmentos=fragmentos
+            )[0],
+            False,
+        )
 
+        perfil.contar("instrucoes", len(instrucoes))
         if not instrucoes:
             print("\nNenhum código intermediário foi gerado")
             return sucesso
@@ -103,9 +267,18 @@ def analisar_arquivo(caminho_arquivo, modo="completo"):
         print("OTIMIZANDO...")
         print("=" * 70)
 
-        otimizado, otimizador = otimizar_codigo(
-            instrucoes, verbose=True, comparar=False
+        otimizado = executar_etapa(
+            "otimizado",
+            lambda: otimizar_codigo(
+                instrucoes,
+                verbose=True,
+                comparar=False,
+                fragmentos=fragmentos,
+                perfil=perfil,
+            )[0],
+            True,
         )
+        perfil.contar("instrucoes_otimizadas", len(otimizado))
 
         print("\nCÓDIGO COM OTIMIZAÇÃO:")
         print("-" * 70)
@@ -116,9 +289,149 @@ def analisar_arquivo(caminho_arquivo, modo="completo"):
         if otimizado:
             print("\nCódigo otimizado gerado com sucesso!")
 
+    if modo == "executar" and ast:
+        from code_generator import gerar_codigo_intermediario
+        from optimizer import otimizar_codigo
+        from vm import ErroExecucao, executar_codigo
+
+        instrucoes = executar_etapa(
+            "codinter",
+            lambda: gerar_codigo_intermediario(
+                ast, verbose=False, fragmentos=fragmentos
+            )[0],
+            False,
+        )
+        perfil.contar("instrucoes", len(instrucoes))
+        otimizado = executar_etapa(
+            "otimizado",
+            lambda: otimizar_codigo(
+                instrucoes, verbose=False, fragmentos=fragmentos, perfil=perfil
+            )[0],
+            False,
+        )
+        perfil.contar("instrucoes_otimizadas", len(otimizado))
+
+        try:
+            with perfil.etapa("execucao"):
+                vm = executar_codigo(otimizado, tabela)
+            perfil.contar("instrucoes_executadas", vm.executadas)
+        except ErroExecucao as e:
+            print(f"\nErro de execução: {e}")
+            return False
+
+    if fragmentos is not None and fragmentos.consultas:
+        perfil.contar(
+            "fragmentos_do_cache", fragmentos.consultas - fragmentos.calculados
+        )
     return sucesso
 
 
+def _iniciar_trabalhador():
+    """
+    Carrega o lexer e as tabelas LALR uma vez por processo do lote
+    """
+    obter_lexer()
+    obter_tabelas()
+
+
+def _analisar_capturado(
+    caminho_arquivo, modo, usar_cache=True, scanner="ply", perfil=None
+):
+    """
+    Roda analisar_arquivo capturando a saída e o relatório de perfil, que o
+    processo principal imprime depois na ordem dos arquivos
+    """
+    saida = StringIO()
+    relatorio = StringIO()
+    inicio = time.perf_counter()
+    with redirect_stdout(saida), redirect_stderr(relatorio):
+        try:
+            sucesso = analisar_arquivo(
+                caminho_arquivo, modo, usar_cache, scanner, perfil
+            )
+        except Exception as e:
+            print(f"Erro ao processar arquivo: {e}")
+            sucesso = False
+    return (
+        caminho_arquivo,
+        sucesso,
+        saida.getvalue(),
+        relatorio.getvalue(),
+        time.perf_counter() - inicio,
+    )
+
+
+def analisar_lote(
+    diretorio,
+    modo="completo",
+    trabalhadores=None,
+    usar_cache=True,
+    scanner="ply",
+    perfil=None,
+):
+    """
+    Analisa todos os .sp de um diretório em um pool de processos
+    A saída de cada arquivo é impressa inteira e em ordem alfabética, seguida
+    de um resumo com o tempo de cada um
+    """
+    # multiprocessing custa dezenas de ms para importar; só o lote paga
+    from concurrent.futures import ProcessPoolExecutor
+
+    arquivos = sorted(str(arq) for arq in Path(diretorio).glob("*.sp"))
+    if not arquivos:
+        print(f"Erro: Nenhum arquivo .sp em '{diretorio}'")
+        return False
+
+    trabalhadores = min(trabalhadores or os.cpu_count() or 1, len(arquivos))
+    lote = max(1, len(arquivos) // (trabalhadores * 4))
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=trabalhadores, initializer=_iniciar_trabalhador
+    ) as executor:
+        resultados = list(
+            executor.map(
+                _analisar_capturado,
+                arquivos,
+                repeat(modo),
+                repeat(usar_cache),
+                repeat(scanner),
+                repeat(perfil),
+                chunksize=lote,
+            )
+        )
+    total = time.perf_counter() - inicio
+
+    for _, _, saida, relatorio, _ in resultados:
+        print(saida, end="")
+        sys.stderr.write(relatorio)
+
+    largura = max(len("Arquivo"), *(len(arq) for arq in arquivos))
+    print("=" * 70)
+    print(f"RESUMO DO LOTE: {diretorio}")
+    print("=" * 70)
+    print(f"{'Arquivo':<{largura}} {'Status':<8} {'Tempo (ms)':>11}")
+    print("-" * (largura + 21))
+    for arquivo, sucesso, _, _, tempo in resultados:
+        status = "SUCESSO" if sucesso else "FALHA"
+        print(f"{arquivo:<{largura}} {status:<8} {tempo * 1e3:>11.2f}")
+    print("-" * (largura + 21))
+
+    sucessos = sum(1 for _, sucesso, _, _, _ in resultados if sucesso)
+    soma = sum(tempo for _, _, _, _, tempo in resultados)
+    print(
+        f"Arquivos: {len(resultados)}  Sucesso: {sucessos}  "
+        f"Falha: {len(resultados) - sucessos}"
+    )
+    print(
+        f"Tempo total: {total * 1e3:.2f} ms com {trabalhadores} processo(s) "
+        f"(soma por arquivo: {soma * 1e3:.2f} ms)"
+    )
+    print("=" * 70)
+
+    return sucessos == len(resultados)
+
+
 def main():
     modo = "completo"
     arquivo = None
@@ -133,6 +446,12 @@ def main():
         print("  -ci, --codinter   Código intermediário SEM otimização")
         print("  -opt, --otimizado Código intermediário COM otimização")
         print("  -c, --completo    Análise completa (padrão)")
+        print("  -run, --executar  Compila com otimização e executa o programa")
+        print("  --batch <dir>     Analisa todos os .sp do diretório em paralelo")
+        print("  -j, --jobs <n>    Número de processos do --batch (padrão: CPUs)")
+        print("  --no-cache        Não usa nem grava o cache de compilação")
+        print("  --scanner <nome>  Analisador léxico: ply (padrão) ou rapido")
+        print("  --profile[=json]  Tempo e memória de cada etapa, na saída de erro")
         print()
         print("Exemplos disponíveis:")
         examples_dir = Path("examples")
@@ -141,7 +460,14 @@ def main():
                 print(f"  - {arq}")
         sys.exit(1)
 
-    for arg in sys.argv[1:]:
+    diretorio_lote = None
+    trabalhadores = None
+    usar_cache = True
+    scanner = "ply"
+    perfil = None
+
+    argumentos = iter(sys.argv[1:])
+    for arg in argumentos:
         if arg in ["-l", "--lexico"]:
             modo = "lexico"
         elif arg in ["-s", "--sintatico"]:
@@ -154,14 +480,48 @@ def main():
             modo = "otimizado"
         elif arg in ["-c", "--completo"]:
             modo = "completo"
+        elif arg in ["-run", "--executar"]:
+            modo = "executar"
+        elif arg == "--no-cache":
+            usar_cache = False
+        elif arg == "--batch":
+            diretorio_lote = next(argumentos, None)
+            if diretorio_lote is None:
+                print("Erro: --batch requer um diretório")
+                sys.exit(1)
+        elif arg in ["-j", "--jobs"]:
+            valor = next(argumentos, "")
+            if not valor.isdigit() or int(valor) < 1:
+                print(f"Erro: {arg} requer um número positivo de processos")
+                sys.exit(1)
+            trabalhadores = int(valor)
+        elif arg == "--scanner":
+            scanner = next(argumentos, "")
+            if scanner not in SCANNERS:
+                print(f"Erro: --scanner deve ser um de: {', '.join(SCANNERS)}")
+                sys.exit(1)
+        elif arg == "--profile" or arg.startswith("--profile="):
+            perfil = arg.partition("=")[2] or "tabela"
+            if perfil not in FORMATOS:
+                print(f"Erro: --profile deve ser um de: {', '.join(FORMATOS)}")
+                sys.exit(1)
         elif not arg.startswith("-"):
             arquivo = arg
 
+    if diretorio_lote:
+        if not os.path.isdir(diretorio_lote):
+            print(f"Erro: Diretório '{diretorio_lote}' não encontrado.")
+            sys.exit(1)
+        sucesso = analisar_lote(
+            diretorio_lote, modo, trabalhadores, usar_cache, scanner, perfil
+        )
+        sys.exit(0 if sucesso else 1)
+
     if not arquivo:
         print("Erro: Nenhum arquivo especificado")
         sys.exit(1)
 
-    analisar_arquivo(arquivo, modo)
+    analisar_arquivo(arquivo, modo, usar_cache, scanner, perfil)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,507 @@
+"""
+Nós da árvore sintática abstrata
+Cada classe de nó tem uma etiqueta inteira (tag), usada pelos visitantes
+para indexar a tabela de despacho, e guarda o trecho do código-fonte de
+onde veio como dois inteiros: o deslocamento do início (inicio) e o
+comprimento. Linha e coluna só são calculadas quando um diagnóstico
+precisa delas (ver posicoes.MapaLinhas)
+"""
+
+PROGRAMA = 0
+CORPO = 1
+DEF_CONST = 2
+CONSTANTE = 3
+DEF_TIPOS = 4
+TIPO = 5
+RECORD = 6
+ARRAY = 7
+DEF_VAR = 8
+VARIAVEL = 9
+FUNCAO = 10
+PARAMETRO = 11
+ATRIBUICAO = 12
+WHILE = 13
+IF = 14
+ELSE = 15
+WRITE = 16
+READ = 17
+ARRAY_ACCESS = 18
+FIELD_ACCESS = 19
+OP_COMP = 20
+OP_ARIT = 21
+CHAMADA_FUNCAO = 22
+NUMERO = 23
+IDENTIFICADOR = 24
+TEXTO = 25
+
+ETIQUETAS = {
+    "PROGRAMA": PROGRAMA,
+    "CORPO": CORPO,
+    "DEF_CONST": DEF_CONST,
+    "CONSTANTE": CONSTANTE,
+    "DEF_TIPOS": DEF_TIPOS,
+    "TIPO": TIPO,
+    "RECORD": RECORD,
+    "ARRAY": ARRAY,
+    "DEF_VAR": DEF_VAR,
+    "VARIAVEL": VARIAVEL,
+    "FUNCAO": FUNCAO,
+    "PARAMETRO": PARAMETRO,
+    "ATRIBUICAO": ATRIBUICAO,
+    "WHILE": WHILE,
+    "IF": IF,
+    "ELSE": ELSE,
+    "WRITE": WRITE,
+    "READ": READ,
+    "ARRAY_ACCESS": ARRAY_ACCESS,
+    "FIELD_ACCESS": FIELD_ACCESS,
+    "OP_COMP": OP_COMP,
+    "OP_ARIT": OP_ARIT,
+    "CHAMADA_FUNCAO": CHAMADA_FUNCAO,
+    "NUMERO": NUMERO,
+    "IDENTIFICADOR": IDENTIFICADOR,
+    "TEXTO": TEXTO,
+}
+
+
+class No:
+    __slots__ = ("inicio", "comprimento")
+
+    tag = None
+    campos = ()
+
+    def filhos(self):
+        for campo in self.campos:
+            yield getattr(self, campo)
+
+    def __repr__(self):
+        valores = ", ".join(
+            f"{campo}={getattr(self, campo)!r}" for campo in self.campos
+        )
+        return f"{type(self).__name__}({valores})"
+
+    def __reduce__(self):
+        # O pickle padrão desce recursivamente e estoura o limite de recursão
+        # em expressões longas; a árvore vai achatada em pós-ordem
+        return (restaurar_arvore, (achatar_arvore(self),))
+
+
+class Programa(No):
+    __slots__ = ("nome", "corpo")
+    tag = PROGRAMA
+    campos = __slots__
+
+    def __init__(self, nome, corpo, inicio=None, comprimento=None):
+        self.nome = nome
+        self.corpo = corpo
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Corpo(No):
+    __slots__ = ("def_const", "def_tipos", "def_var", "lista_func", "lista_comandos")
+    tag = CORPO
+    campos = __slots__
+
+    def __init__(
+        self,
+        def_const,
+        def_tipos,
+        def_var,
+        lista_func,
+        lista_comandos,
+        inicio=None,
+        comprimento=None,
+    ):
+        self.def_const = def_const
+        self.def_tipos = def_tipos
+        self.def_var = def_var
+        self.lista_func = lista_func
+        self.lista_comandos = lista_comandos
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class DefConst(No):
+    __slots__ = ("lista_const",)
+    tag = DEF_CONST
+    campos = __slots__
+
+    def __init__(self, lista_const, inicio=None, comprimento=None):
+        self.lista_const = lista_const
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Constante(No):
+    """
+    nome = valor; o valor é um nó Numero ou Texto
+    """
+
+    __slots__ = ("nome", "valor")
+    tag = CONSTANTE
+    campos = __slots__
+
+    def __init__(self, nome, valor, inicio=None, comprimento=None):
+        self.nome = nome
+        self.valor = valor
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class DefTipos(No):
+    __slots__ = ("lista_tipos",)
+    tag = DEF_TIPOS
+    campos = __slots__
+
+    def __init__(self, lista_tipos, inicio=None, comprimento=None):
+        self.lista_tipos = lista_tipos
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Tipo(No):
+    """
+    Declaração de tipo; tipo_dado é um nome (str), Record ou Array
+    """
+
+    __slots__ = ("nome", "tipo_dado")
+    tag = TIPO
+    campos = __slots__
+
+    def __init__(self, nome, tipo_dado, inicio=None, comprimento=None):
+        self.nome = nome
+        self.tipo_dado = tipo_dado
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Record(No):
+    __slots__ = ("lista_var",)
+    tag = RECORD
+    campos = __slots__
+
+    def __init__(self, lista_var, inicio=None, comprimento=None):
+        self.lista_var = lista_var
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Array(No):
+    __slots__ = ("tamanho", "tipo_elemento")
+    tag = ARRAY
+    campos = __slots__
+
+    def __init__(self, tamanho, tipo_elemento, inicio=None, comprimento=None):
+        self.tamanho = tamanho
+        self.tipo_elemento = tipo_elemento
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class DefVar(No):
+    __slots__ = ("lista_var",)
+    tag = DEF_VAR
+    campos = __slots__
+
+    def __init__(self, lista_var, inicio=None, comprimento=None):
+        self.lista_var = lista_var
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Variavel(No):
+    __slots__ = ("lista_id", "tipo_dado")
+    tag = VARIAVEL
+    campos = __slots__
+
+    def __init__(self, lista_id, tipo_dado, inicio=None, comprimento=None):
+        self.lista_id = lista_id
+        self.tipo_dado = tipo_dado
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Funcao(No):
+    __slots__ = ("nome", "lista_param", "tipo_retorno", "def_var", "lista_comandos")
+    tag = FUNCAO
+    campos = __slots__
+
+    def __init__(
+        self,
+        nome,
+        lista_param,
+        tipo_retorno,
+        def_var,
+        lista_comandos,
+        inicio=None,
+        comprimento=None,
+    ):
+        self.nome = nome
+        self.lista_param = lista_param
+        self.tipo_retorno = tipo_retorno
+        self.def_var = def_var
+        self.lista_comandos = lista_comandos
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Parametro(No):
+    __slots__ = ("lista_id", "tipo_dado")
+    tag = PARAMETRO
+    campos = __slots__
+
+    def __init__(self, lista_id, tipo_dado, inicio=None, comprimento=None):
+        self.lista_id = lista_id
+        self.tipo_dado = tipo_dado
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Atribuicao(No):
+    __slots__ = ("lvalue", "expressao")
+    tag = ATRIBUICAO
+    campos = __slots__
+
+    def __init__(self, lvalue, expressao, inicio=None, comprimento=None):
+        self.lvalue = lvalue
+        self.expressao = expressao
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class While(No):
+    __slots__ = ("condicao", "lista_comandos")
+    tag = WHILE
+    campos = __slots__
+
+    def __init__(self, condicao, lista_comandos, inicio=None, comprimento=None):
+        self.condicao = condicao
+        self.lista_comandos = lista_comandos
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class If(No):
+    __slots__ = ("condicao", "comandos_then", "else_parte")
+    tag = IF
+    campos = __slots__
+
+    def __init__(self, condicao, comandos_then, else_parte, inicio=None, comprimento=None):
+        self.condicao = condicao
+        self.comandos_then = comandos_then
+        self.else_parte = else_parte
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Else(No):
+    __slots__ = ("lista_comandos",)
+    tag = ELSE
+    campos = __slots__
+
+    def __init__(self, lista_comandos, inicio=None, comprimento=None):
+        self.lista_comandos = lista_comandos
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Write(No):
+    """
+    write(valor); o valor é um Texto ou uma expressão
+    """
+
+    __slots__ = ("valor",)
+    tag = WRITE
+    campos = __slots__
+
+    def __init__(self, valor, inicio=None, comprimento=None):
+        self.valor = valor
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Read(No):
+    __slots__ = ("nome",)
+    tag = READ
+    campos = __slots__
+
+    def __init__(self, nome, inicio=None, comprimento=None):
+        self.nome = nome
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class ArrayAccess(No):
+    __slots__ = ("nome", "indice")
+    tag = ARRAY_ACCESS
+    campos = __slots__
+
+    def __init__(self, nome, indice, inicio=None, comprimento=None):
+        self.nome = nome
+        self.indice = indice
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class FieldAccess(No):
+    """
+    base.campo; a base é um nome (str) ou um ArrayAccess
+    """
+
+    __slots__ = ("base", "campo")
+    tag = FIELD_ACCESS
+    campos = __slots__
+
+    def __init__(self, base, campo, inicio=None, comprimento=None):
+        self.base = base
+        self.campo = campo
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class OpComp(No):
+    __slots__ = ("op", "esq", "dir")
+    tag = OP_COMP
+    campos = __slots__
+
+    def __init__(self, op, esq, dir, inicio=None, comprimento=None):
+        self.op = op
+        self.esq = esq
+        self.dir = dir
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class OpArit(No):
+    __slots__ = ("op", "esq", "dir")
+    tag = OP_ARIT
+    campos = __slots__
+
+    def __init__(self, op, esq, dir, inicio=None, comprimento=None):
+        self.op = op
+        self.esq = esq
+        self.dir = dir
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class ChamadaFuncao(No):
+    __slots__ = ("nome", "args")
+    tag = CHAMADA_FUNCAO
+    campos = __slots__
+
+    def __init__(self, nome, args, inicio=None, comprimento=None):
+        self.nome = nome
+        self.args = args
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Numero(No):
+    __slots__ = ("valor",)
+    tag = NUMERO
+    campos = __slots__
+
+    def __init__(self, valor, inicio=None, comprimento=None):
+        self.valor = valor
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Identificador(No):
+    __slots__ = ("nome",)
+    tag = IDENTIFICADOR
+    campos = __slots__
+
+    def __init__(self, nome, inicio=None, comprimento=None):
+        self.nome = nome
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+class Texto(No):
+    """
+    Literal de string (sem as aspas, já removidas pelo léxico)
+    """
+
+    __slots__ = ("valor",)
+    tag = TEXTO
+    campos = __slots__
+
+    def __init__(self, valor, inicio=None, comprimento=None):
+        self.valor = valor
+        self.inicio = inicio
+        self.comprimento = comprimento
+
+
+CLASSES = {classe.tag: classe for classe in No.__subclasses__()}
+
+# Operações da forma achatada: empilha um valor, junta os n últimos em uma
+# lista, ou monta um nó com os len(campos) últimos
+VALOR = 0
+LISTA = 1
+NO = 2
+
+
+def achatar_arvore(raiz, posicoes=True):
+    """
+    Árvore em pós-ordem como lista de tuplas, sem recursão
+    Sem as posições, o resultado só depende da estrutura e dos valores, e
+    serve de impressão digital da subárvore
+    """
+    codigo = []
+    pilha = [(raiz, False)]
+    while pilha:
+        item, pronto = pilha.pop()
+        if isinstance(item, No):
+            if not pronto:
+                pilha.append((item, True))
+                for campo in reversed(item.campos):
+                    pilha.append((getattr(item, campo), False))
+            elif posicoes:
+                codigo.append((NO, item.tag, item.inicio, item.comprimento))
+            else:
+                codigo.append((NO, item.tag))
+        elif isinstance(item, list):
+            if pronto:
+                codigo.append((LISTA, len(item)))
+            else:
+                pilha.append((item, True))
+                for filho in reversed(item):
+                    pilha.append((filho, False))
+        else:
+            codigo.append((VALOR, item))
+    return codigo
+
+
+def restaurar_arvore(codigo):
+    """
+    Inverso de achatar_arvore
+    """
+    pilha = []
+    for operacao in codigo:
+        tipo = operacao[0]
+        if tipo == VALOR:
+            pilha.append(operacao[1])
+        elif tipo == LISTA:
+            n = operacao[1]
+            if n:
+                lista = pilha[-n:]
+                del pilha[-n:]
+            else:
+                lista = []
+            pilha.append(lista)
+        else:
+            _, tag, inicio, comprimento = operacao
+            classe = CLASSES[tag]
+            no = classe.__new__(classe)
+            n = len(classe.campos)
+            if n:
+                for campo, valor in zip(classe.campos, pilha[-n:]):
+                    setattr(no, campo, valor)
+                del pilha[-n:]
+            no.inicio = inicio
+            no.comprimento = comprimento
+            pilha.append(no)
+    return pilha[0]
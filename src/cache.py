@@ -0,0 +1,208 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+NOME_APLICACAO = "compilador"
+
+
+def diretorio_cache(*subdiretorios):
+    """
+    Diretório de cache do compilador, criado na primeira chamada
+    COMPILADOR_CACHE tem precedência; senão usa $XDG_CACHE_HOME/compilador
+    ou ~/.cache/compilador, e cai no diretório temporário do sistema se
+    não for possível criá-lo
+    """
+    base = os.environ.get("COMPILADOR_CACHE")
+    if base:
+        caminho = Path(base)
+    else:
+        xdg = os.environ.get("XDG_CACHE_HOME")
+        raiz = Path(xdg) if xdg else Path.home() / ".cache"
+        caminho = raiz / NOME_APLICACAO
+    try:
+        caminho = caminho.joinpath(*subdiretorios)
+        caminho.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        caminho = Path(tempfile.gettempdir(), NOME_APLICACAO, *subdiretorios)
+        caminho.mkdir(parents=True, exist_ok=True)
+    return caminho
+
+
+LIMITE_PADRAO = 64 * 1024 * 1024
+
+_versao = None
+_gravados_desde_poda = None
+
+
+def versao_compilador():
+    """
+    Hash do código-fonte do compilador (os .py deste diretório)
+    Qualquer alteração no compilador invalida todo o cache de compilação
+    """
+    global _versao
+    if _versao is None:
+        resumo = hashlib.sha256()
+        for arquivo in sorted(Path(__file__).parent.glob("*.py")):
+            resumo.update(arquivo.name.encode("utf-8"))
+            resumo.update(arquivo.read_bytes())
+        _versao = resumo.hexdigest()
+    return _versao
+
+
+class CacheCompilacao:
+    """
+    Cache em disco dos resultados de cada etapa da compilação de um arquivo
+    A chave de uma etapa combina a versão do compilador, o caminho e o
+    conteúdo do arquivo, o nome da etapa e os parâmetros que mudam o que ela
+    imprime. Cada entrada guarda o resultado e a saída impressa, que é
+    repetida quando a etapa é reaproveitada. O diretório é limitado em
+    tamanho: as entradas usadas há mais tempo (pelo mtime, renovado a cada
+    acerto) são apagadas primeiro
+    """
+
+    def __init__(
+        self, caminho, fonte, ativo=True, diretorio=None, limite=LIMITE_PADRAO
+    ):
+        self.ativo = ativo
+        self.limite = limite
+        self.acertos = 0
+        if not ativo:
+            return
+        if diretorio is None:
+            diretorio = diretorio_cache("compilacao")
+        self.diretorio = Path(diretorio)
+        resumo = hashlib.sha256()
+        for parte in (versao_compilador(), caminho, fonte):
+            resumo.update(parte.encode("utf-8"))
+            resumo.update(b"\0")
+        self.resumo = resumo.hexdigest()
+
+    def executar(self, etapa, calcular, *parametros):
+        """
+        Resultado de calcular(), reaproveitado do cache quando possível
+        """
+        if not self.ativo:
+            return calcular()
+
+        arquivo = self.arquivo(etapa, parametros)
+        entrada = self.ler(arquivo)
+        if entrada is not None:
+            self.acertos += 1
+            resultado, saida = entrada
+            sys.stdout.write(saida)
+            return resultado
+
+        capturada = StringIO()
+        try:
+            with redirect_stdout(capturada):
+                resultado = calcular()
+        finally:
+            saida = capturada.getvalue()
+            sys.stdout.write(saida)
+        self.gravar(arquivo, (resultado, saida))
+        return resultado
+
+    def reaproveitar(self, chave, calcular):
+        """
+        Resultado de calcular() guardado sob uma chave (bytes) que não
+        depende do arquivo compilado, para partes que se repetem entre
+        versões de um arquivo ou entre arquivos; não captura saída
+        """
+        if not self.ativo:
+            return calcular()
+
+        resumo = hashlib.sha256(versao_compilador().encode("utf-8"))
+        resumo.update(b"\0")
+        resumo.update(chave)
+        arquivo = self.diretorio / f"{resumo.hexdigest()}.pickle"
+        entrada = self.ler(arquivo)
+        if entrada is not None:
+            return entrada[0]
+
+        resultado = calcular()
+        self.gravar(arquivo, (resultado,))
+        return resultado
+
+    def arquivo(self, etapa, parametros):
+        chave = f"{self.resumo}\0{etapa}\0{parametros!r}".encode("utf-8")
+        return self.diretorio / f"{hashlib.sha256(chave).hexdigest()}.pickle"
+
+    def ler(self, arquivo):
+        try:
+            with open(arquivo, "rb") as f:
+                entrada = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Entrada corrompida ou de classes que mudaram: descarta
+            self.remover(arquivo)
+            return None
+        try:
+            os.utime(arquivo)
+        except OSError:
+            pass
+        return entrada
+
+    def gravar(self, arquivo, entrada):
+        global _gravados_desde_poda
+        try:
+            dados = pickle.dumps(entrada, pickle.HIGHEST_PROTOCOL)
+        except (RecursionError, pickle.PicklingError, TypeError, AttributeError):
+            # Árvores muito profundas (expressões com milhares de termos)
+            # passam do limite de recursão do pickle; a etapa fica sem cache
+            return
+        if len(dados) > self.limite:
+            return
+
+        # Grava em um arquivo temporário e renomeia, para que outro processo
+        # nunca leia uma entrada pela metade
+        temporario = arquivo.with_name(f"{arquivo.name}.{os.getpid()}")
+        try:
+            temporario.write_bytes(dados)
+            os.replace(temporario, arquivo)
+        except OSError:
+            self.remover(temporario)
+            return
+
+        # Varrer o diretório a cada gravação custaria caro em lotes grandes;
+        # poda na primeira gravação do processo e depois a cada 1/8 do limite
+        if _gravados_desde_poda is None or _gravados_desde_poda > self.limite // 8:
+            self.podar()
+            _gravados_desde_poda = 0
+        _gravados_desde_poda += len(dados)
+
+    def podar(self):
+        """
+        Apaga as entradas menos usadas até o total caber no limite
+        """
+        entradas = []
+        total = 0
+        try:
+            with os.scandir(self.diretorio) as itens:
+                for item in itens:
+                    if item.name.endswith(".pickle"):
+                        info = item.stat()
+                        entradas.append((info.st_mtime, info.st_size, item.path))
+                        total += info.st_size
+        except OSError:
+            return
+        if total <= self.limite:
+            return
+        entradas.sort()
+        for _, tamanho, caminho in entradas:
+            self.remover(caminho)
+            total -= tamanho
+            if total <= self.limite:
+                break
+
+    @staticmethod
+    def remover(arquivo):
+        try:
+            os.remove(arquivo)
+        except OSError:
+            pass
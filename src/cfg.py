@@ -0,0 +1,445 @@
+from functools import cached_property
+
+from code_generator import OPS_ATRIBUICAO, OPS_DESVIO, eh_composto, eh_temporario
+
+
+def regioes(instructions):
+    """
+    Divide o código em regiões: uma por função (de LBL FUNC_x até o RET)
+    e uma para o programa principal, que vem depois de todas as funções
+    Retorna tuplas (nome_funcao, inicio, fim); o principal tem nome None
+    """
+    resultado = []
+    inicio = None
+    nome = None
+    inicio_principal = None
+
+    for i, instr in enumerate(instructions):
+        if nome is not None:
+            if instr.op == "RET":
+                resultado.append((nome, inicio, i + 1))
+                nome = None
+            continue
+
+        if instr.op == "LBL" and str(instr.addr1).startswith("FUNC_"):
+            nome = str(instr.addr1)[len("FUNC_"):]
+            inicio = i
+        elif inicio_principal is None:
+            inicio_principal = i
+
+    if nome is not None:
+        resultado.append((nome, inicio, len(instructions)))
+
+    if inicio_principal is not None:
+        resultado.append((None, inicio_principal, len(instructions)))
+
+    return resultado
+
+
+class BasicBlock:
+    def __init__(self, indice, codigo, inicio, fim):
+        self.indice = indice
+        self.codigo = codigo
+        self.inicio = inicio
+        self.fim = fim
+        self.sucessores = []
+        self.predecessores = []
+
+    @property
+    def rotulo(self):
+        primeira = self.codigo[self.inicio]
+        if primeira.op == "LBL":
+            return primeira.addr1
+        return None
+
+    @property
+    def ultima(self):
+        return self.codigo[self.fim - 1]
+
+    def __len__(self):
+        return self.fim - self.inicio
+
+    def __repr__(self):
+        return (
+            f"BasicBlock({self.indice}, [{self.inicio}:{self.fim}], "
+            f"succ={[b.indice for b in self.sucessores]})"
+        )
+
+
+class Loop:
+    def __init__(self, cabecalho, blocos):
+        self.cabecalho = cabecalho
+        self.blocos = blocos
+
+    def __contains__(self, bloco):
+        indice = bloco.indice if isinstance(bloco, BasicBlock) else bloco
+        return indice in self.blocos
+
+    def __repr__(self):
+        return f"Loop(B{self.cabecalho.indice}, {sorted(self.blocos)})"
+
+
+class CFG:
+    """
+    Grafo de fluxo de controle do código de três endereços
+    Os blocos são montados em uma passada sobre as instruções; análises
+    derivadas (ordem reversa, dominadores) são calculadas sob demanda e
+    ficam guardadas no próprio grafo
+    """
+
+    def __init__(self, instructions):
+        self.instructions = instructions
+        self.blocos = []
+        self.bloco_do_rotulo = {}
+        self.entradas = []
+        self.bloco_da_instrucao = [0] * len(instructions)
+
+        self._construir()
+
+    def _construir(self):
+        instructions = self.instructions
+        n = len(instructions)
+        if n == 0:
+            return
+
+        lideres = [False] * n
+        lideres[0] = True
+        for i, instr in enumerate(instructions):
+            if instr.op == "LBL":
+                lideres[i] = True
+            elif instr.op in OPS_DESVIO or instr.op == "RET":
+                if i + 1 < n:
+                    lideres[i + 1] = True
+
+        inicio = 0
+        for i in range(1, n + 1):
+            if i == n or lideres[i]:
+                bloco = BasicBlock(len(self.blocos), instructions, inicio, i)
+                self.blocos.append(bloco)
+                rotulo = bloco.rotulo
+                if rotulo is not None:
+                    self.bloco_do_rotulo[rotulo] = bloco
+                for j in range(inicio, i):
+                    self.bloco_da_instrucao[j] = bloco.indice
+                inicio = i
+
+        for bloco in self.blocos:
+            ultima = bloco.ultima
+            proximo = bloco.indice + 1
+
+            if ultima.op == "JMP":
+                alvos = [self.bloco_do_rotulo.get(ultima.addr1)]
+            elif ultima.op == "JNZ":
+                alvos = [self.bloco_do_rotulo.get(ultima.addr1)]
+                if proximo < len(self.blocos):
+                    alvos.append(self.blocos[proximo])
+            elif ultima.op == "RET":
+                alvos = []
+            elif proximo < len(self.blocos):
+                alvos = [self.blocos[proximo]]
+            else:
+                alvos = []
+
+            for alvo in alvos:
+                if alvo is not None and alvo not in bloco.sucessores:
+                    bloco.sucessores.append(alvo)
+                    alvo.predecessores.append(bloco)
+
+        for _, inicio, _ in regioes(instructions):
+            self.entradas.append(self.blocos[self.bloco_da_instrucao[inicio]])
+
+    @cached_property
+    def ordem_reversa(self):
+        """
+        Blocos alcançáveis em pós-ordem reversa a partir das entradas
+        """
+        visitados = [False] * len(self.blocos)
+        pos_ordem = []
+
+        for entrada in self.entradas:
+            if visitados[entrada.indice]:
+                continue
+            visitados[entrada.indice] = True
+            pilha = [(entrada, iter(entrada.sucessores))]
+            while pilha:
+                bloco, filhos = pilha[-1]
+                for filho in filhos:
+                    if not visitados[filho.indice]:
+                        visitados[filho.indice] = True
+                        pilha.append((filho, iter(filho.sucessores)))
+                        break
+                else:
+                    pilha.pop()
+                    pos_ordem.append(bloco)
+
+        pos_ordem.reverse()
+        return pos_ordem
+
+    @cached_property
+    def alcancaveis(self):
+        return {bloco.indice for bloco in self.ordem_reversa}
+
+    @cached_property
+    def dominador_imediato(self):
+        """
+        Dominador imediato de cada bloco (Cooper, Harvey e Kennedy)
+        Entradas dominam a si mesmas; blocos inalcançáveis ficam com None
+        """
+        ordem = self.ordem_reversa
+        numero = {bloco.indice: i for i, bloco in enumerate(ordem)}
+        idom = [None] * len(self.blocos)
+        for entrada in self.entradas:
+            idom[entrada.indice] = entrada.indice
+
+        def intersectar(a, b):
+            while a != b:
+                while numero[a] > numero[b]:
+                    a = idom[a]
+                while numero[b] > numero[a]:
+                    b = idom[b]
+            return a
+
+        mudou = True
+        while mudou:
+            mudou = False
+            for bloco in ordem:
+                if idom[bloco.indice] == bloco.indice:
+                    continue
+
+                novo = None
+                for pred in bloco.predecessores:
+                    if idom[pred.indice] is None:
+                        continue
+                    if novo is None:
+                        novo = pred.indice
+                    else:
+                        novo = intersectar(pred.indice, novo)
+
+                if novo is not None and idom[bloco.indice] != novo:
+                    idom[bloco.indice] = novo
+                    mudou = True
+
+        return idom
+
+    @cached_property
+    def filhos_dominancia(self):
+        filhos = [[] for _ in self.blocos]
+        for bloco in self.ordem_reversa:
+            pai = self.dominador_imediato[bloco.indice]
+            if pai is not None and pai != bloco.indice:
+                filhos[pai].append(bloco)
+        return filhos
+
+    @cached_property
+    def _intervalos_dominancia(self):
+        entrada_em = [0] * len(self.blocos)
+        saida_em = [-1] * len(self.blocos)
+        relogio = 0
+
+        for raiz in self.entradas:
+            pilha = [(raiz, False)]
+            while pilha:
+                bloco, terminado = pilha.pop()
+                if terminado:
+                    saida_em[bloco.indice] = relogio
+                    relogio += 1
+                    continue
+                entrada_em[bloco.indice] = relogio
+                relogio += 1
+                pilha.append((bloco, True))
+                for filho in reversed(self.filhos_dominancia[bloco.indice]):
+                    pilha.append((filho, False))
+
+        return entrada_em, saida_em
+
+    @cached_property
+    def lacos(self):
+        """
+        Laços naturais, um por cabeçalho, do mais interno ao mais externo
+        Uma aresta b -> h é de retorno quando h domina b; o corpo são os
+        blocos que alcançam b sem passar por h
+        """
+        corpos = {}
+        for bloco in self.ordem_reversa:
+            for suc in bloco.sucessores:
+                if not self.domina(suc, bloco):
+                    continue
+                corpo = corpos.setdefault(suc.indice, {suc.indice})
+                pilha = [bloco]
+                while pilha:
+                    atual = pilha.pop()
+                    if atual.indice in corpo or atual.indice not in self.alcancaveis:
+                        continue
+                    corpo.add(atual.indice)
+                    pilha.extend(atual.predecessores)
+
+        lacos = [Loop(self.blocos[h], corpo) for h, corpo in corpos.items()]
+        lacos.sort(key=lambda laco: len(laco.blocos))
+        return lacos
+
+    @cached_property
+    def vivacidade(self):
+        return LivenessAnalysis(self)
+
+    def domina(self, a, b):
+        """
+        Verdadeiro se o bloco a domina o bloco b (em tempo constante)
+        """
+        entrada_em, saida_em = self._intervalos_dominancia
+        ia = a.indice if isinstance(a, BasicBlock) else a
+        ib = b.indice if isinstance(b, BasicBlock) else b
+        if saida_em[ia] < 0 or saida_em[ib] < 0:
+            return False
+        return entrada_em[ia] <= entrada_em[ib] and saida_em[ib] <= saida_em[ia]
+
+
+class LivenessAnalysis:
+    """
+    Análise de vivacidade para trás sobre os blocos básicos
+    Só recebem um bit as variáveis que podem estar vivas na fronteira de um
+    bloco: as não temporárias e os temporários lidos em algum bloco antes de
+    serem definidos nele. Os demais temporários nascem e morrem dentro de um
+    bloco e não entram nos conjuntos, que assim continuam pequenos mesmo em
+    código longo e sem desvios; os conjuntos são inteiros do Python, então
+    união e diferença custam uma operação por bloco.
+    Convenções conservadoras para chamadas: CALL lê todas as variáveis não
+    temporárias e, ao final de uma função (RET), elas continuam vivas
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.bits = {}
+        self.globais = 0
+
+        instructions = cfg.instructions
+        for bloco in cfg.blocos:
+            definidos = set()
+            for i in range(bloco.inicio, bloco.fim):
+                instr = instructions[i]
+                for var in instr.usos():
+                    if var not in definidos or not eh_temporario(var):
+                        self._numerar(var)
+                dest = instr.destino()
+                if dest is not None:
+                    if eh_temporario(dest):
+                        definidos.add(dest)
+                    else:
+                        self._numerar(dest)
+
+        self.efeitos = [self._efeito(instr) for instr in instructions]
+
+        n_blocos = len(cfg.blocos)
+        self.usa = [0] * n_blocos
+        self.define = [0] * n_blocos
+        self.entrada = [0] * n_blocos
+        self.saida = [0] * n_blocos
+
+        for bloco in cfg.blocos:
+            usa = 0
+            define = 0
+            for i in range(bloco.fim - 1, bloco.inicio - 1, -1):
+                gera, mata = self.efeitos[i]
+                if gera is None:
+                    gera = self.globais
+                usa = (usa & ~mata) | gera
+                define |= mata
+            self.usa[bloco.indice] = usa
+            self.define[bloco.indice] = define
+
+        self._resolver()
+
+    def _numerar(self, nome):
+        if nome not in self.bits:
+            bit = 1 << len(self.bits)
+            self.bits[nome] = bit
+            if not eh_temporario(nome):
+                self.globais |= bit
+
+    def _efeito(self, instr):
+        """
+        Par (gera, mata) de uma instrução; gera None indica todas as globais
+        """
+        if instr.op == "CALL":
+            return None, 0
+
+        bits = self.bits
+        gera = 0
+        for var in instr.usos():
+            gera |= bits.get(var, 0)
+
+        mata = 0
+        dest = instr.destino()
+        if dest is not None and not self._escrita_parcial(instr):
+            mata = bits.get(dest, 0)
+
+        return gera, mata
+
+    def _escrita_parcial(self, instr):
+        # a[i] := x e r.campo := x não matam a variável a ou r
+        return instr.op in OPS_ATRIBUICAO and eh_composto(instr.addr1)
+
+    def transferir(self, indice, vivas):
+        gera, mata = self.efeitos[indice]
+        if gera is None:
+            gera = self.globais
+        return (vivas & ~mata) | gera
+
+    def atribuicoes_mortas(self, bloco):
+        """
+        Índices das atribuições do bloco cujo destino não é lido depois
+        O bloco é percorrido de trás para frente; uma atribuição morta não
+        torna vivos os seus operandos. Temporários sem bit são acompanhados
+        em um conjunto que só existe durante a passada
+        """
+        instructions = self.cfg.instructions
+        bits = self.bits
+        vivas = self.saida[bloco.indice]
+        locais = set()
+        mortas = []
+
+        for i in range(bloco.fim - 1, bloco.inicio - 1, -1):
+            instr = instructions[i]
+            dest = instr.destino()
+
+            if instr.op in OPS_ATRIBUICAO:
+                bit = bits.get(dest)
+                viva = dest in locais if bit is None else vivas & bit
+                if not viva:
+                    mortas.append(i)
+                    continue
+
+            vivas = self.transferir(i, vivas)
+            if dest is not None and dest not in bits:
+                if not self._escrita_parcial(instr):
+                    locais.discard(dest)
+            for var in instr.usos():
+                if var not in bits:
+                    locais.add(var)
+
+        return mortas
+
+    def _resolver(self):
+        cfg = self.cfg
+        ordem = list(reversed(cfg.ordem_reversa))
+        pendentes = set(bloco.indice for bloco in ordem)
+
+        while pendentes:
+            for bloco in ordem:
+                indice = bloco.indice
+                if indice not in pendentes:
+                    continue
+                pendentes.discard(indice)
+
+                if bloco.ultima.op == "RET":
+                    saida = self.globais
+                else:
+                    saida = 0
+                for suc in bloco.sucessores:
+                    saida |= self.entrada[suc.indice]
+                self.saida[indice] = saida
+
+                entrada = (saida & ~self.define[indice]) | self.usa[indice]
+                if entrada != self.entrada[indice]:
+                    self.entrada[indice] = entrada
+                    for pred in bloco.predecessores:
+                        pendentes.add(pred.indice)
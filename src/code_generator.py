@@ -1,10 +1,126 @@
+from ast_nodes import (
+    ARRAY_ACCESS,
+    CHAMADA_FUNCAO,
+    FIELD_ACCESS,
+    IDENTIFICADOR,
+    NUMERO,
+    OP_ARIT,
+    OP_COMP,
+    TEXTO,
+    No,
+)
+from dispatch import tabela_de_despacho
+from operands import COMPOSTOS, NOMES, VARIAVEIS, Const, Field, Index, Temp, Var
+
+
+OPS_ARITMETICAS = frozenset({"ADD", "SUB", "MUL", "DIV"})
+OPS_COMPARACAO = frozenset({"GTR", "LES", "EQL", "NEQ"})
+OPS_BINARIAS = OPS_ARITMETICAS | OPS_COMPARACAO
+OPS_ATRIBUICAO = OPS_BINARIAS | {"MOV"}
+OPS_DESVIO = frozenset({"JMP", "JNZ"})
+OPS_PRESERVADAS = frozenset(
+    {"WRITE", "READ", "CALL", "RET", "JMP", "JNZ", "LBL", "PUSH", "POP"}
+)
+
+
+def avaliar_operacao(op, esq, dir):
+    """
+    Semântica das operações binárias do código intermediário
+    Divisão entre inteiros trunca em direção a zero; comparações
+    resultam em 1 (verdadeiro) ou 0 (falso)
+    """
+    if op == "ADD":
+        return esq + dir
+    if op == "SUB":
+        return esq - dir
+    if op == "MUL":
+        return esq * dir
+    if op == "DIV":
+        if isinstance(esq, int) and isinstance(dir, int):
+            quociente = abs(esq) // abs(dir)
+            return -quociente if (esq < 0) != (dir < 0) else quociente
+        return esq / dir
+    if op == "GTR":
+        return int(esq > dir)
+    if op == "LES":
+        return int(esq < dir)
+    if op == "EQL":
+        return int(esq == dir)
+    if op == "NEQ":
+        return int(esq != dir)
+    raise ValueError(f"Operação desconhecida: {op}")
+
+
+def eh_variavel(addr):
+    return isinstance(addr, VARIAVEIS)
+
+
+def variaveis_endereco(addr):
+    """
+    Variáveis lidas ao avaliar um endereço
+    Acessos compostos (a[TEMP1], r.campo) leem a base e o índice
+    """
+    if isinstance(addr, NOMES):
+        return (addr,)
+    if isinstance(addr, Index):
+        return variaveis_endereco(addr.base) + variaveis_endereco(addr.indice)
+    if isinstance(addr, Field):
+        return variaveis_endereco(addr.base)
+    return ()
+
+
+def eh_temporario(addr):
+    return isinstance(addr, Temp)
+
+
+def eh_composto(addr):
+    return isinstance(addr, COMPOSTOS)
+
+
 class Instruction:
+    __slots__ = ("op", "addr1", "addr2", "addr3")
+
     def __init__(self, op, addr1=None, addr2=None, addr3=None):
         self.op = op
         self.addr1 = addr1
         self.addr2 = addr2
         self.addr3 = addr3
 
+    def __reduce__(self):
+        return (Instruction, (self.op, self.addr1, self.addr2, self.addr3))
+
+    def destino(self):
+        """
+        Variável escrita pela instrução (a base, em acessos compostos)
+        """
+        if self.op in OPS_ATRIBUICAO:
+            return variaveis_endereco(self.addr1)[0]
+        if self.op in {"READ", "POP"}:
+            return self.addr1
+        return None
+
+    def usos(self):
+        """
+        Variáveis lidas pela instrução
+        Uma escrita em a[TEMP1] ou r.campo preserva o restante da base,
+        por isso também conta como leitura da base e do índice
+        """
+        op = self.op
+        if op == "MOV":
+            usos = variaveis_endereco(self.addr2)
+        elif op in OPS_BINARIAS:
+            usos = variaveis_endereco(self.addr2) + variaveis_endereco(self.addr3)
+        elif op in {"WRITE", "PUSH"}:
+            return variaveis_endereco(self.addr1)
+        elif op == "JNZ":
+            return variaveis_endereco(self.addr2)
+        else:
+            return ()
+
+        if eh_composto(self.addr1):
+            usos = usos + variaveis_endereco(self.addr1)
+        return usos
+
     def __str__(self):
         parts = [self.op]
         if self.addr1 is not None:
@@ -19,11 +135,25 @@ class Instruction:
         return f"Instruction({self.op}, {self.addr1}, {self.addr2}, {self.addr3})"
 
 
+OPERADORES_ARITMETICOS = {"+": "ADD", "-": "SUB", "*": "MUL", "/": "DIV"}
+OPERADORES_COMPARACAO = {">": "GTR", "<": "LES", "=": "EQL", "!": "NEQ"}
+
+
 class CodeGenerator:
-    def __init__(self):
+    """
+    Cada função é gerada como um fragmento independente: temporários e
+    rótulos dela levam o nome da função (TEMP_f_1, LABEL_f_1) e a numeração
+    recomeça, então o código de uma função não depende do resto do programa.
+    Com fragmentos (ver incremental.Fragmentos), o código de funções que não
+    mudaram é reaproveitado em vez de gerado de novo
+    """
+
+    def __init__(self, fragmentos=None):
         self.instructions = [] 
         self.temp_counter = 0  
         self.label_counter = 0 
+        self.prefixo = ""
+        self.fragmentos = fragmentos
 
     def gerar(self, ast):
         if ast is None:
@@ -32,6 +162,7 @@ class CodeGenerator:
         self.instructions = []
         self.temp_counter = 0
         self.label_counter = 0
+        self.prefixo = ""
 
         self.visitar(ast)
 
@@ -39,11 +170,11 @@ class CodeGenerator:
 
     def novo_temp(self):
         self.temp_counter += 1
-        return f"TEMP{self.temp_counter}"
+        return Temp(f"TEMP{self.prefixo}{self.temp_counter}")
 
     def novo_label(self):
         self.label_counter += 1
-        return f"LABEL{self.label_counter}"
+        return f"LABEL{self.prefixo}{self.label_counter}"
 
     def emitir(self, op, addr1=None, addr2=None, addr3=None):
         instr = Instruction(op, addr1, addr2, addr3)
@@ -54,14 +185,13 @@ class CodeGenerator:
         if no is None:
             return None
 
-        if isinstance(no, tuple) and len(no) > 0:
-            tipo_no = no[0]
-            metodo = f"gerar_{tipo_no.lower()}"
+        if isinstance(no, No):
+            metodo = self.DESPACHO[no.tag]
 
-            if hasattr(self, metodo):
-                return getattr(self, metodo)(no)
+            if metodo is not None:
+                return metodo(self, no)
             else:
-                for filho in no[1:]:
+                for filho in no.filhos():
                     self.visitar(filho)
                 return None
 
@@ -75,50 +205,88 @@ class CodeGenerator:
             return no
 
     def gerar_programa(self, no):
-        _, nome, corpo = no
-        self.visitar(corpo)
+        self.visitar(no.corpo)
 
     def gerar_corpo(self, no):
-        _, def_const, def_tipos, def_var, lista_func, lista_comandos = no
-
-        if lista_func:
-            for funcao in lista_func:
+        if no.lista_func:
+            for funcao in no.lista_func:
                 self.visitar(funcao)
 
-        if lista_comandos:
-            for comando in lista_comandos:
+        # Constantes são variáveis globais atribuídas no início do
+        # programa principal, antes de qualquer chamada de função
+        if no.def_const:
+            for constante in no.def_const.lista_const:
+                self.emitir("MOV", Var(constante.nome), Const(constante.valor.valor))
+
+        if no.lista_comandos:
+            for comando in no.lista_comandos:
                 self.visitar(comando)
 
     def gerar_funcao(self, no):
-        _, nome, lista_param, tipo_retorno, def_var, lista_comandos = no
+        if self.fragmentos is None:
+            codigo = self.gerar_fragmento_funcao(no)
+        else:
+            codigo = self.fragmentos.codigo_funcao(
+                no, lambda: self.gerar_fragmento_funcao(no)
+            )
+        self.instructions.extend(codigo)
+
+    def gerar_fragmento_funcao(self, no):
+        """
+        Código de uma função, com numeração própria de temporários e rótulos
+        """
+        estado = (
+            self.instructions,
+            self.temp_counter,
+            self.label_counter,
+            self.prefixo,
+        )
+        self.instructions = []
+        self.temp_counter = 0
+        self.label_counter = 0
+
+        nome = no.nome
+        self.prefixo = f"_{nome}_"
 
         self.emitir("LBL", f"FUNC_{nome}")
 
-        if lista_comandos:
-            for comando in lista_comandos:
+        parametros = []
+        for param in no.lista_param or []:
+            parametros.extend(param.lista_id)
+        for id_nome in reversed(parametros):
+            self.emitir("POP", Var(id_nome))
+
+        if no.lista_comandos:
+            for comando in no.lista_comandos:
                 self.visitar(comando)
 
+        self.emitir("PUSH", Var(nome))
         self.emitir("RET")
 
-    def gerar_atribuicao(self, no):
-        _, lvalue, expressao = no
+        codigo = self.instructions
+        (
+            self.instructions,
+            self.temp_counter,
+            self.label_counter,
+            self.prefixo,
+        ) = estado
+        return codigo
 
-        temp_expr = self.gerar_expressao(expressao)
+    def gerar_atribuicao(self, no):
+        temp_expr = self.gerar_expressao(no.expressao)
 
-        addr_lvalue = self.processar_lvalue(lvalue)
+        addr_lvalue = self.processar_lvalue(no.lvalue)
 
         self.emitir("MOV", addr_lvalue, temp_expr)
 
     def gerar_while(self, no):
-        _, condicao, lista_comandos = no
-
         label_ini = self.novo_label()
         label_bloco = self.novo_label()
         label_fim = self.novo_label()
 
         self.emitir("LBL", label_ini)
 
-        temp_cond = self.gerar_expressao(condicao)
+        temp_cond = self.gerar_expressao(no.condicao)
 
         self.emitir("JNZ", label_bloco, temp_cond)
 
@@ -126,7 +294,7 @@ class CodeGenerator:
 
         self.emitir("LBL", label_bloco)
 
-        for comando in lista_comandos:
+        for comando in no.lista_comandos:
             self.visitar(comando)
 
         self.emitir("JMP", label_ini)
@@ -134,18 +302,17 @@ class CodeGenerator:
         self.emitir("LBL", label_fim)
 
     def gerar_if(self, no):
-        _, condicao, comandos_then, else_parte = no
+        comandos_then = no.comandos_then
 
-        temp_cond = self.gerar_expressao(condicao)
+        temp_cond = self.gerar_expressao(no.condicao)
 
-        if else_parte:
+        if no.else_parte:
             label_then = self.novo_label()
             label_fim = self.novo_label()
 
             self.emitir("JNZ", label_then, temp_cond)
 
-            _, comandos_else = else_parte
-            for comando in comandos_else:
+            for comando in no.else_parte.lista_comandos:
                 self.visitar(comando)
 
             self.emitir("JMP", label_fim)
@@ -172,123 +339,138 @@ class CodeGenerator:
             self.emitir("LBL", label_fim)
 
     def gerar_write(self, no):
-        _, valor = no
+        valor = no.valor
 
-        if isinstance(valor, tuple):
+        if valor.tag in (TEXTO, NUMERO):
+            self.emitir("WRITE", Const(valor.valor))
+        elif valor.tag == IDENTIFICADOR:
+            self.emitir("WRITE", Var(valor.nome))
+        else:
             temp = self.gerar_expressao(valor)
             self.emitir("WRITE", temp)
-        else:
-            self.emitir("WRITE", valor)
 
     def gerar_read(self, no):
-        _, id_nome = no
-        self.emitir("READ", id_nome)
+        self.emitir("READ", Var(no.nome))
 
     def gerar_expressao(self, expr):
+        """
+        Gera o código de uma expressão e devolve o endereço do resultado
+        A árvore é percorrida em pós-ordem com pilha explícita, então a
+        profundidade da expressão não esbarra no limite de recursão; cada
+        quadro é (nó, etapa) e os endereços dos filhos ficam em resultados
+        """
         if expr is None:
             return None
 
-        if isinstance(expr, (int, float)):
-            temp = self.novo_temp()
-            self.emitir("MOV", temp, expr)
-            return temp
-
-        if isinstance(expr, str):
-            if expr.startswith('"') or expr.startswith("'"):
-                return expr
-            return expr
+        resultados = []
+        pilha = [(expr, 0)]
 
-        if isinstance(expr, tuple):
-            tipo_expr = expr[0]
+        while pilha:
+            no, etapa = pilha.pop()
+            tag = no.tag
 
-            if tipo_expr == "OP_ARIT":
-                _, op, esq, dir = expr
+            if tag == NUMERO:
+                temp = self.novo_temp()
+                self.emitir("MOV", temp, Const(no.valor))
+                resultados.append(temp)
 
-                temp_esq = self.gerar_expressao(esq)
-                temp_dir = self.gerar_expressao(dir)
-                temp_resultado = self.novo_temp()
-
-                op_map = {"+": "ADD", "-": "SUB", "*": "MUL", "/": "DIV"}
+            elif tag == IDENTIFICADOR:
+                resultados.append(Var(no.nome))
 
-                instr_op = op_map.get(op, "ADD")
-                self.emitir(instr_op, temp_resultado, temp_esq, temp_dir)
+            elif tag == TEXTO:
+                resultados.append(Const(no.valor))
 
-                return temp_resultado
+            elif tag == OP_ARIT or tag == OP_COMP:
+                if etapa == 0:
+                    pilha.append((no, 1))
+                    pilha.append((no.dir, 0))
+                    pilha.append((no.esq, 0))
+                    continue
 
-            elif tipo_expr == "OP_COMP":
-                _, op, esq, dir = expr
-
-                temp_esq = self.gerar_expressao(esq)
-                temp_dir = self.gerar_expressao(dir)
+                temp_dir = resultados.pop()
+                temp_esq = resultados.pop()
                 temp_resultado = self.novo_temp()
 
-                op_map = {">": "GTR", "<": "LES", "=": "EQL", "!": "NEQ"}
-
-                instr_op = op_map.get(op, "EQL")
+                if tag == OP_ARIT:
+                    instr_op = OPERADORES_ARITMETICOS.get(no.op, "ADD")
+                else:
+                    instr_op = OPERADORES_COMPARACAO.get(no.op, "EQL")
                 self.emitir(instr_op, temp_resultado, temp_esq, temp_dir)
 
-                return temp_resultado
+                resultados.append(temp_resultado)
 
-            elif tipo_expr == "ARRAY_ACCESS":
-                _, id_nome, indice = expr
+            elif tag == ARRAY_ACCESS:
+                if etapa == 0:
+                    pilha.append((no, 1))
+                    pilha.append((no.indice, 0))
+                    continue
 
-                temp_indice = self.gerar_expressao(indice)
+                temp_indice = resultados.pop()
                 temp_resultado = self.novo_temp()
 
-                self.emitir("MOV", temp_resultado, f"{id_nome}[{temp_indice}]")
+                self.emitir("MOV", temp_resultado, Index(Var(no.nome), temp_indice))
 
-                return temp_resultado
+                resultados.append(temp_resultado)
 
-            elif tipo_expr == "FIELD_ACCESS":
-                _, id_base, campo = expr
+            elif tag == FIELD_ACCESS:
+                id_base = no.base
 
-                if isinstance(id_base, tuple):
-                    temp_base = self.gerar_expressao(id_base)
-                    base = temp_base
+                if isinstance(id_base, No):
+                    if etapa == 0:
+                        pilha.append((no, 1))
+                        pilha.append((id_base, 0))
+                        continue
+                    base = resultados.pop()
                 else:
-                    base = id_base
+                    base = Var(id_base)
 
                 temp_resultado = self.novo_temp()
 
-                self.emitir("MOV", temp_resultado, f"{base}.{campo}")
+                self.emitir("MOV", temp_resultado, Field(base, no.campo))
 
-                return temp_resultado
+                resultados.append(temp_resultado)
 
-            elif tipo_expr == "CHAMADA_FUNCAO":
-                _, nome, args = expr
+            elif tag == CHAMADA_FUNCAO:
+                # etapa k: os k primeiros argumentos já foram avaliados
+                if etapa > 0:
+                    self.emitir("PUSH", resultados.pop())
 
-                for arg in args:
-                    temp_arg = self.gerar_expressao(arg)
-                    self.emitir("PUSH", temp_arg)
+                if etapa < len(no.args):
+                    pilha.append((no, etapa + 1))
+                    pilha.append((no.args[etapa], 0))
+                    continue
 
-                self.emitir("CALL", nome)
+                self.emitir("CALL", no.nome)
 
                 temp_resultado = self.novo_temp()
                 self.emitir("POP", temp_resultado)
 
-                return temp_resultado
+                resultados.append(temp_resultado)
 
-        return None
+            else:
+                resultados.append(None)
+
+        return resultados.pop()
 
     def processar_lvalue(self, lvalue):
-        if isinstance(lvalue, str):
-            return lvalue
+        tag = lvalue.tag
 
-        elif isinstance(lvalue, tuple):
-            if lvalue[0] == "ARRAY_ACCESS":
-                _, id_nome, indice = lvalue
-                temp_indice = self.gerar_expressao(indice)
-                return f"{id_nome}[{temp_indice}]"
+        if tag == IDENTIFICADOR:
+            return Var(lvalue.nome)
 
-            elif lvalue[0] == "FIELD_ACCESS":
-                _, id_base, campo = lvalue
+        elif tag == ARRAY_ACCESS:
+            temp_indice = self.gerar_expressao(lvalue.indice)
+            return Index(Var(lvalue.nome), temp_indice)
 
-                if isinstance(id_base, tuple):
-                    base = self.processar_lvalue(id_base)
-                else:
-                    base = id_base
+        elif tag == FIELD_ACCESS:
+            id_base = lvalue.base
 
-                return f"{base}.{campo}"
+            if isinstance(id_base, No):
+                base = self.processar_lvalue(id_base)
+            else:
+                base = Var(id_base)
+
+            return Field(base, lvalue.campo)
 
         return lvalue
 
@@ -311,8 +493,11 @@ class CodeGenerator:
         print("=" * 70)
 
 
-def gerar_codigo_intermediario(ast, verbose=True):
-    gerador = CodeGenerator()
+CodeGenerator.DESPACHO = tabela_de_despacho(CodeGenerator, "gerar_")
+
+
+def gerar_codigo_intermediario(ast, verbose=True, fragmentos=None):
+    gerador = CodeGenerator(fragmentos)
     instrucoes = gerador.gerar(ast)
 
     if verbose:
@@ -0,0 +1,16 @@
+from ast_nodes import ETIQUETAS
+
+
+def tabela_de_despacho(classe, prefixo):
+    """
+    Lista indexada pela etiqueta do nó com o método que o trata
+    Um método prefixo_nome trata os nós de etiqueta NOME; a tabela é montada
+    uma vez por classe, e etiquetas sem método ficam com None
+    """
+    tabela = [None] * len(ETIQUETAS)
+    for nome in dir(classe):
+        if nome.startswith(prefixo):
+            etiqueta = ETIQUETAS.get(nome[len(prefixo):].upper())
+            if etiqueta is not None:
+                tabela[etiqueta] = getattr(classe, nome)
+    return tabela
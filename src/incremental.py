@@ -0,0 +1,128 @@
+import pickle
+import re
+
+from ast_nodes import CHAMADA_FUNCAO, No, achatar_arvore
+
+
+def chamadas(no):
+    """
+    Nomes das funções chamadas dentro de uma subárvore
+    """
+    nomes = set()
+    pilha = [no]
+    while pilha:
+        item = pilha.pop()
+        if isinstance(item, No):
+            if item.tag == CHAMADA_FUNCAO:
+                nomes.add(item.nome)
+            for campo in item.campos:
+                filho = getattr(item, campo)
+                if isinstance(filho, (No, list)):
+                    pilha.append(filho)
+        elif isinstance(item, list):
+            pilha.extend(item)
+    return nomes
+
+
+CHAMADA = re.compile(r"([A-Za-z][A-Za-z0-9_]*)\s*\(")
+
+
+def _assinatura(nome, tabela):
+    simbolo = tabela.buscar(nome, "global") if tabela is not None else None
+    if simbolo is None or simbolo.classificacao != "funcao":
+        return (nome, None)
+    tipos = tuple(tipo for tipo, _ in simbolo.parametros)
+    return (nome, tipos, simbolo.tipo_retorno)
+
+
+def impressao_funcao(no, tabela=None):
+    """
+    Impressão digital de uma função: a subárvore sem posições (mover a
+    função de linha não a invalida) e a assinatura de cada função chamada,
+    como está na tabela de símbolos
+    """
+    assinaturas = [_assinatura(nome, tabela) for nome in sorted(chamadas(no))]
+    return achatar_arvore(no, posicoes=False), assinaturas
+
+
+def impressoes_por_trecho(ast, fonte, tabela=None):
+    """
+    Impressões digitais das funções do programa a partir do texto-fonte,
+    bem mais baratas que percorrer cada subárvore
+    O trecho de uma função vai do seu FUNCTION até o FUNCTION seguinte (ou
+    o BEGIN do programa principal); trechos iguais produzem subárvores
+    iguais. As assinaturas cobrem todo nome seguido de "(" no trecho que
+    seja uma função, o que inclui as chamadas. Funções cujo trecho não pode
+    ser localizado com segurança ficam de fora (id do nó -> impressão)
+    """
+    corpo = getattr(ast, "corpo", None)
+    funcoes = getattr(corpo, "lista_func", None)
+    if not funcoes:
+        return {}
+
+    def deslocamento(no, palavra):
+        if no is None or no.inicio is None:
+            return None
+        pos = no.inicio
+        if fonte[pos : pos + len(palavra)].lower() != palavra:
+            return None
+        return pos
+
+    limites = [deslocamento(no, "function") for no in funcoes]
+    limites.append(deslocamento(corpo, "begin"))
+
+    impressoes = {}
+    for i, no in enumerate(funcoes):
+        inicio, fim = limites[i], limites[i + 1]
+        if inicio is None or fim is None:
+            continue
+        trecho = fonte[inicio:fim]
+        nomes = sorted(set(CHAMADA.findall(trecho)))
+        impressoes[id(no)] = (trecho, [_assinatura(n, tabela) for n in nomes])
+    return impressoes
+
+
+class Fragmentos:
+    """
+    Código intermediário e otimização de cada função, reaproveitados entre
+    compilações através do cache em disco
+    O código de uma função é procurado pela impressão digital dela; o
+    resultado otimizado de um fragmento (função ou programa principal),
+    pelo código de entrada e pelo contexto que ele recebe dos outros
+    fragmentos (ver optimizer.contextos_fragmentos)
+    """
+
+    def __init__(self, cache, tabela=None, ast=None, fonte=None):
+        self.cache = cache
+        self.tabela = tabela
+        self.consultas = 0
+        self.calculados = 0
+        self.impressoes = {}
+        if ast is not None and fonte is not None:
+            self.impressoes = impressoes_por_trecho(ast, fonte, tabela)
+
+    def codigo_funcao(self, no, gerar):
+        impressao = self.impressoes.get(id(no))
+        if impressao is None:
+            impressao = ("arvore", impressao_funcao(no, self.tabela))
+        chave = ("codigo", impressao)
+        return self._reaproveitar(chave, gerar)
+
+    def otimizacao(self, codigo, definidos_fora, lidos_fora, otimizar):
+        chave = (
+            "otimizado",
+            list(codigo),
+            sorted(map(str, definidos_fora)),
+            sorted(map(str, lidos_fora)),
+        )
+        return self._reaproveitar(chave, otimizar)
+
+    def _reaproveitar(self, chave, calcular):
+        self.consultas += 1
+
+        def contar():
+            self.calculados += 1
+            return calcular()
+
+        dados = pickle.dumps(chave, pickle.HIGHEST_PROTOCOL)
+        return self.cache.reaproveitar(dados, contar)
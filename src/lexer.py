@@ -1,3 +1,8 @@
+import mmap
+import os
+import re
+from functools import partial
+
 import ply.lex as lex
 
 tokens = (
@@ -87,6 +92,7 @@ def t_NUMBER(t):
     Números: sequência de dígitos podendo conter no máximo um ponto
     Exemplos: 123, 12.3, .789, 345.
     """
+    t.comprimento = len(t.value)
     if "." in t.value:
         t.value = float(t.value)
     else:
@@ -100,6 +106,8 @@ def t_STRING(t):
     Strings: sequência alfanumérica entre aspas duplas
     Remove as aspas do valor
     """
+    t.lexer.lineno += t.value.count("\n")
+    t.comprimento = len(t.value)
     t.value = t.value[1:-1]
     return t
 
@@ -119,9 +127,10 @@ def t_COMMENT(t):
     r"\{[^}]*\}"
     """
     Comentários: texto entre chaves { }
-    São ignorados pelo analisador léxico
+    São ignorados pelo analisador léxico, mas as quebras de linha dentro
+    deles contam para a numeração
     """
-    pass
+    t.lexer.lineno += t.value.count("\n")
 
 
 def t_newline(t):
@@ -138,19 +147,185 @@ t_ignore = " \t"
 def t_error(t):
     """
     Tratamento de erros léxicos
-    Caracteres não reconhecidos são reportados
+    Caracteres não reconhecidos são reportados; um lexer com a lista
+    mensagens (ver BufferTokens) guarda a mensagem em vez de imprimi-la
     """
-    print(f"Caractere ilegal '{t.value[0]}' na linha {t.lineno}")
+    coluna = t.lexpos - t.lexer.lexdata.rfind("\n", 0, t.lexpos)
+    mensagem = (
+        f"Caractere ilegal '{t.value[0]}' na linha {t.lineno}, coluna {coluna}"
+    )
+    mensagens = getattr(t.lexer, "mensagens", None)
+    if mensagens is None:
+        print(mensagem)
+    else:
+        mensagens.append(mensagem)
     t.lexer.skip(1)
 
 
-lexer = lex.lex()
+def comprimento_token(tok):
+    """
+    Comprimento do lexema de um token no código-fonte
+    NUMBER e STRING guardam o seu, porque o valor deles já não é o texto
+    lido; nos outros tokens o valor é o próprio lexema
+    """
+    if tok.type == "NUMBER" or tok.type == "STRING":
+        return tok.comprimento
+    return len(tok.value)
+
+
+_lexer = None
+
+
+def obter_lexer():
+    """
+    Lexer do módulo, construído no primeiro uso
+    Montar a expressão mestre custa mais que o resto da importação, e nem
+    todo uso do módulo precisa dela. Serve de modelo: cada análise trabalha
+    em um clone, que tem a própria entrada e contagem de linhas
+    """
+    global _lexer
+    if _lexer is None:
+        _lexer = lex.lex()
+    return _lexer
+
+
+def __getattr__(nome):
+    # Compatibilidade com "from lexer import lexer"
+    if nome == "lexer":
+        return obter_lexer()
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+
+class BufferTokens:
+    """
+    Tokens de uma entrada, lidos uma única vez e reaproveitados pela
+    listagem de tokens e pelo parser
+    As mensagens de erro léxico ficam na sequência, entre os tokens, e são
+    impressas por quem percorre o buffer no ponto em que o lexer as
+    imprimiria
+    """
+
+    __slots__ = ("itens",)
+
+    def __init__(self, data):
+        lexer = obter_lexer().clone()
+        lexer.mensagens = mensagens = []
+        lexer.input(data)
+        itens = []
+        for tok in iter(lexer.token, None):
+            if mensagens:
+                itens.extend(mensagens)
+                mensagens.clear()
+            itens.append(tok)
+        itens.extend(mensagens)
+        self.itens = itens
+
+    def tokens(self):
+        """
+        Percorre os tokens, imprimindo as mensagens de erro no caminho
+        """
+        for item in self.itens:
+            if isinstance(item, str):
+                print(item)
+            else:
+                yield item
+
+    def funcao_token(self):
+        """
+        Função sem argumentos que devolve o próximo token (None no fim),
+        no formato do tokenfunc do ply.yacc
+        """
+        return partial(next, self.tokens(), None)
+
+
+TAMANHO_TRECHO = 1 << 20
+
+_ABERTURA = re.compile(rb'[{"]')
+_FECHAMENTO = {ord("{"): b"}", ord('"'): b'"'}
+
+
+def _fim_trecho(dados, inicio, tamanho):
+    """
+    Fim do trecho que começa em inicio: logo depois da última quebra de
+    linha a até tamanho bytes que não esteja dentro de um comentário ou de
+    uma string (nenhum outro token atravessa linhas)
+    Como nas regras t_COMMENT e t_STRING, um { ou " sem fechamento em todo
+    o resto do arquivo é só um caractere, e não abre nada
+    """
+    total = len(dados)
+    alvo = inicio + tamanho
+    pos = inicio
+    while alvo < total:
+        abertura = _ABERTURA.search(dados, pos, alvo)
+        if abertura is None:
+            quebra = dados.rfind(b"\n", pos, alvo)
+            if quebra >= 0:
+                return quebra + 1
+            # Nenhum ponto de corte seguro até o alvo: aumenta o trecho
+            alvo += tamanho
+            continue
+        fecha = _FECHAMENTO[dados[abertura.start()]]
+        fechamento = dados.find(fecha, abertura.end())
+        pos = abertura.end() if fechamento < 0 else fechamento + 1
+        alvo = max(alvo, pos)
+    return total
+
+
+def trechos_arquivo(caminho, tamanho_trecho=TAMANHO_TRECHO):
+    """
+    Gera o texto de um arquivo em trechos de cerca de tamanho_trecho bytes,
+    sem carregá-lo inteiro na memória
+    O arquivo é mapeado com mmap e cortado em quebras de linha fora de
+    comentários e strings, então cada trecho pode ser lexado sozinho. As
+    quebras de linha são normalizadas como na leitura em modo texto, e as
+    páginas já entregues são devolvidas ao sistema
+    """
+    with open(caminho, "rb") as arquivo:
+        if os.fstat(arquivo.fileno()).st_size == 0:
+            return
+        with mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+            inicio = 0
+            liberado = 0
+            while inicio < len(dados):
+                fim = _fim_trecho(dados, inicio, tamanho_trecho)
+                texto = dados[inicio:fim].decode("utf-8")
+                if "\r" in texto:
+                    texto = texto.replace("\r\n", "\n").replace("\r", "\n")
+                yield texto
+                inicio = fim
+
+                ate = fim - fim % mmap.PAGESIZE
+                if ate > liberado and hasattr(mmap, "MADV_DONTNEED"):
+                    try:
+                        dados.madvise(mmap.MADV_DONTNEED, liberado, ate - liberado)
+                    except OSError:
+                        pass
+                    liberado = ate
+
+
+def tokens_arquivo(caminho, tamanho_trecho=TAMANHO_TRECHO):
+    """
+    Gera os tokens de um arquivo lido por trechos_arquivo, com memória que
+    não cresce com o arquivo
+    Linha e lexpos dos tokens são os da leitura do arquivo inteiro
+    (lexpos conta caracteres)
+    """
+    lexer = obter_lexer().clone()
+    lexer.lineno = 1
+    base = 0
+    for texto in trechos_arquivo(caminho, tamanho_trecho):
+        lexer.input(texto)
+        for tok in iter(lexer.token, None):
+            tok.lexpos += base
+            yield tok
+        base += len(texto)
 
 
 def tokenize(data):
     """
     Tokeniza uma string de entrada e retorna lista de tokens
     """
+    lexer = obter_lexer().clone()
     lexer.input(data)
     tokens_list = []
     while True:
@@ -164,14 +339,16 @@ def tokenize(data):
 def print_tokens(data):
     """
     Imprime os tokens encontrados no formato legível
+    Aceita o código-fonte, um BufferTokens já lido ou qualquer iterável de
+    tokens, como tokens_arquivo
     """
-    lexer.input(data)
+    if isinstance(data, str):
+        data = BufferTokens(data)
+    if isinstance(data, BufferTokens):
+        data = data.tokens()
     print(f"{'Token':<20} {'Lexema':<20} {'Linha':<10}")
     print("-" * 50)
-    while True:
-        tok = lexer.token()
-        if not tok:
-            break
+    for tok in data:
         print(f"{tok.type:<20} {str(tok.value):<20} {tok.lineno:<10}")
 
 
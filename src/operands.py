@@ -0,0 +1,148 @@
+import threading
+from weakref import WeakValueDictionary
+
+# WeakValueDictionary.setdefault não é atômico; o lock garante que duas
+# threads criando o mesmo operando fiquem com o mesmo objeto. Consultas a
+# operandos já internados não passam por ele
+_registro = threading.Lock()
+
+
+def _registrar(internados, chave, novo):
+    with _registro:
+        return internados.setdefault(chave, novo)
+
+
+class Operand:
+    """
+    Operando do código de três endereços
+    Instâncias são internadas: o mesmo operando é sempre o mesmo objeto,
+    então comparação e hash custam o mesmo que comparar identidade
+    As tabelas de internação guardam referências fracas: um operando sai
+    delas quando nenhum código o usa mais, então um processo que compila
+    muitos arquivos não acumula todo nome que já viu. A identidade continua
+    valendo, porque só operandos vivos podem ser comparados
+    """
+
+    __slots__ = ("__weakref__",)
+
+    def __setattr__(self, nome, valor):
+        raise AttributeError(f"{type(self).__name__} é imutável")
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self})"
+
+
+class Var(Operand):
+    __slots__ = ("nome",)
+    _internados = WeakValueDictionary()
+
+    def __new__(cls, nome):
+        operando = cls._internados.get(nome)
+        if operando is None:
+            novo = object.__new__(cls)
+            object.__setattr__(novo, "nome", nome)
+            operando = _registrar(cls._internados, nome, novo)
+        return operando
+
+    def __reduce__(self):
+        return (Var, (self.nome,))
+
+    def __str__(self):
+        return self.nome
+
+
+class Temp(Operand):
+    __slots__ = ("nome",)
+    _internados = WeakValueDictionary()
+
+    def __new__(cls, nome):
+        operando = cls._internados.get(nome)
+        if operando is None:
+            novo = object.__new__(cls)
+            object.__setattr__(novo, "nome", nome)
+            operando = _registrar(cls._internados, nome, novo)
+        return operando
+
+    def __reduce__(self):
+        return (Temp, (self.nome,))
+
+    def __str__(self):
+        return self.nome
+
+
+class Const(Operand):
+    __slots__ = ("valor",)
+    _internados = WeakValueDictionary()
+
+    def __new__(cls, valor):
+        chave = (type(valor), valor)
+        operando = cls._internados.get(chave)
+        if operando is None:
+            novo = object.__new__(cls)
+            object.__setattr__(novo, "valor", valor)
+            operando = _registrar(cls._internados, chave, novo)
+        return operando
+
+    def __reduce__(self):
+        return (Const, (self.valor,))
+
+    def __str__(self):
+        if isinstance(self.valor, str):
+            return f'"{self.valor}"'
+        return str(self.valor)
+
+
+class Index(Operand):
+    """
+    Elemento de array: base[indice]
+    """
+
+    __slots__ = ("base", "indice")
+    _internados = WeakValueDictionary()
+
+    def __new__(cls, base, indice):
+        chave = (base, indice)
+        operando = cls._internados.get(chave)
+        if operando is None:
+            novo = object.__new__(cls)
+            object.__setattr__(novo, "base", base)
+            object.__setattr__(novo, "indice", indice)
+            operando = _registrar(cls._internados, chave, novo)
+        return operando
+
+    def __reduce__(self):
+        return (Index, (self.base, self.indice))
+
+    def __str__(self):
+        return f"{self.base}[{self.indice}]"
+
+
+class Field(Operand):
+    """
+    Campo de registro: base.campo (a base pode ser um Index)
+    """
+
+    __slots__ = ("base", "campo")
+    _internados = WeakValueDictionary()
+
+    def __new__(cls, base, campo):
+        chave = (base, campo)
+        operando = cls._internados.get(chave)
+        if operando is None:
+            novo = object.__new__(cls)
+            object.__setattr__(novo, "base", base)
+            object.__setattr__(novo, "campo", campo)
+            operando = _registrar(cls._internados, chave, novo)
+        return operando
+
+    def __reduce__(self):
+        return (Field, (self.base, self.campo))
+
+    def __str__(self):
+        return f"{self.base}.{self.campo}"
+
+
+NOMES = (Var, Temp)
+COMPOSTOS = (Index, Field)
+VARIAVEIS = (Var, Temp, Index, Field)
+
@@ -1,14 +1,105 @@
-from code_generator import Instruction
+from collections import ChainMap, Counter
+from itertools import count
+
+from code_generator import (
+    Instruction,
+    OPS_ATRIBUICAO,
+    OPS_BINARIAS,
+    OPS_PRESERVADAS,
+    avaliar_operacao,
+    eh_composto,
+    eh_temporario,
+    eh_variavel,
+    variaveis_endereco,
+)
+from cfg import CFG, regioes
+from operands import Const, Field, Index
+from profiler import INATIVO
+
+
+def dividir_fragmentos(instructions):
+    """
+    Código de cada função e do programa principal, na ordem do programa
+    """
+    return [instructions[inicio:fim] for _, inicio, fim in regioes(instructions)]
+
+
+def contextos_fragmentos(fragmentos):
+    """
+    O que cada fragmento precisa saber dos outros para ser otimizado sozinho:
+    as variáveis que ele lê e que outro fragmento define (não são estáveis)
+    e as que ele define e que outro fragmento lê (atribuições a elas nunca
+    são código morto). Temporários são locais ao fragmento e ficam de fora
+    """
+    definidos = []
+    lidos = []
+    quantos_definem = Counter()
+    quantos_leem = Counter()
+    for codigo in fragmentos:
+        escritas = set()
+        leituras = set()
+        for instr in codigo:
+            dest = instr.destino()
+            if dest is not None and not eh_temporario(dest):
+                escritas.add(dest)
+            for var in instr.usos():
+                if not eh_temporario(var):
+                    leituras.add(var)
+        definidos.append(escritas)
+        lidos.append(leituras)
+        quantos_definem.update(escritas)
+        quantos_leem.update(leituras)
+
+    return [
+        (
+            frozenset(v for v in leituras if quantos_definem[v] > (v in escritas)),
+            frozenset(v for v in escritas if quantos_leem[v] > (v in leituras)),
+        )
+        for escritas, leituras in zip(definidos, lidos)
+    ]
 
 
 class Optimizer:
-    def __init__(self):
+    """
+    Cada função e o programa principal são otimizados como fragmentos
+    independentes; o único conhecimento sobre os outros fragmentos vem de
+    contextos_fragmentos. Com fragmentos (ver incremental.Fragmentos), o
+    resultado de fragmentos que não mudaram é reaproveitado; com um perfil
+    (profiler.Perfil), cada passe é medido como uma etapa
+    """
+
+    PASSES = (
+        "propagar_constantes",
+        "simplificar_desvios",
+        "numerar_valores",
+        "propagar_copias",
+        "eliminar_codigo_morto",
+        "eliminar_atribuicoes_mortas",
+        "mover_invariantes",
+        "coalescer_temporarios",
+    )
+
+    def __init__(self, fragmentos=None, perfil=INATIVO):
         self.statistics = {
             "original": 0,
             "optimized": 0,
             "removed": 0,
             "percentage": 0.0,
         }
+        self._cfg = None
+        self.fragmentos = fragmentos
+        self.perfil = perfil
+        self.definidos_fora = frozenset()
+        self.lidos_fora = frozenset()
+
+    def obter_cfg(self, instructions):
+        """
+        CFG compartilhado entre os passes
+        Só é reconstruído quando um passe devolve uma nova lista de instruções
+        """
+        if self._cfg is None or self._cfg.instructions is not instructions:
+            self._cfg = CFG(instructions)
+        return self._cfg
 
     def otimizar(self, instructions):
         if not instructions:
@@ -16,7 +107,21 @@ class Optimizer:
 
         self.statistics["original"] = len(instructions)
 
-        optimized = self.eliminar_codigo_morto(instructions)
+        fragmentos = dividir_fragmentos(instructions)
+        optimized = []
+        for codigo, (definidos, lidos) in zip(
+            fragmentos, contextos_fragmentos(fragmentos)
+        ):
+            if self.fragmentos is None:
+                resultado = self.otimizar_fragmento(codigo, definidos, lidos)
+            else:
+                resultado = self.fragmentos.otimizacao(
+                    codigo,
+                    definidos,
+                    lidos,
+                    lambda: self.otimizar_fragmento(codigo, definidos, lidos),
+                )
+            optimized.extend(resultado)
 
         self.statistics["optimized"] = len(optimized)
         self.statistics["removed"] = (
@@ -30,117 +135,775 @@ class Optimizer:
 
         return optimized
 
-    def eliminar_codigo_morto(self, instructions):
-        preserve_ops = {
-            "WRITE",
-            "READ",
-            "CALL",
-            "RET",
-            "JMP",
-            "JNZ",
-            "LBL",
-            "PUSH",
-            "POP",
-        }
+    def otimizar_fragmento(
+        self, instructions, definidos_fora=frozenset(), lidos_fora=frozenset()
+    ):
+        """
+        Passes sobre o código de uma função ou do programa principal
+        definidos_fora e lidos_fora vêm de contextos_fragmentos
+        """
+        self.definidos_fora = definidos_fora
+        self.lidos_fora = lidos_fora
+        optimized = instructions
+        try:
+            for passe in self.PASSES:
+                with self.perfil.etapa(f"otimizacao/{passe}"):
+                    optimized = getattr(self, passe)(optimized)
+        finally:
+            self.definidos_fora = frozenset()
+            self.lidos_fora = frozenset()
+        return optimized
 
-        used_vars = set()
+    def propagar_constantes(self, instructions):
+        """
+        Propagação condicional de constantes (Wegman e Zadeck)
+        Só blocos alcançados por arestas executáveis são visitados; um JNZ
+        com condição constante torna executável apenas um dos lados.
+        Cada bloco guarda o mapa variável -> constante na entrada; o encontro
+        de predecessores mantém apenas as constantes em que todos concordam.
+        Na reescrita, operações sobre constantes viram MOV do resultado,
+        desvios constantes são resolvidos e blocos nunca executados saem
+        """
+        cfg = self.obter_cfg(instructions)
+        entrada = [None] * len(cfg.blocos)
+        saida = [None] * len(cfg.blocos)
+        arestas = set()
+        pendentes = []
+
+        for bloco in cfg.entradas:
+            entrada[bloco.indice] = {}
+            pendentes.append(bloco)
+
+        while pendentes:
+            bloco = pendentes.pop()
+            constantes = dict(entrada[bloco.indice])
+            for i in range(bloco.inicio, bloco.fim):
+                self._transferir_constantes(instructions[i], constantes)
+            saida[bloco.indice] = constantes
+
+            for suc in self._sucessores_executaveis(cfg, bloco, constantes):
+                arestas.add((bloco.indice, suc.indice))
+                if suc in cfg.entradas:
+                    novo = {}
+                else:
+                    novo = self._encontro_constantes(
+                        saida[pred.indice]
+                        for pred in suc.predecessores
+                        if (pred.indice, suc.indice) in arestas
+                    )
+                if novo != entrada[suc.indice]:
+                    entrada[suc.indice] = novo
+                    pendentes.append(suc)
 
-        for instr in instructions:
-            op = instr.op
+        optimized = []
+        for bloco in cfg.blocos:
+            if entrada[bloco.indice] is None:
+                continue
+
+            constantes = dict(entrada[bloco.indice])
+            for i in range(bloco.inicio, bloco.fim):
+                instr = instructions[i]
+                nova = self._reescrever_constantes(instr, constantes)
+                self._transferir_constantes(instr, constantes)
+                if nova is not None:
+                    optimized.append(nova)
 
-            if op in preserve_ops:
-                if op in {"WRITE", "JNZ", "PUSH"}:
-                    if instr.addr1 and self.is_variable(instr.addr1):
-                        used_vars.add(instr.addr1)
+        return optimized
 
-            elif op in {"MOV"}:
-                if instr.addr2 and self.is_variable(instr.addr2):
-                    used_vars.add(instr.addr2)
+    def simplificar_desvios(self, instructions):
+        """
+        Remove JMP para o rótulo seguinte e rótulos que ninguém referencia
+        (rótulos de função são sempre mantidos)
+        """
+        optimized = []
+        for i, instr in enumerate(instructions):
+            if instr.op == "JMP" and i + 1 < len(instructions):
+                proxima = instructions[i + 1]
+                if proxima.op == "LBL" and proxima.addr1 == instr.addr1:
+                    continue
+            optimized.append(instr)
 
-            elif op in {"ADD", "SUB", "MUL", "DIV", "GTR", "LES", "EQL", "NEQ"}:
-                if instr.addr2 and self.is_variable(instr.addr2):
-                    used_vars.add(instr.addr2)
-                if instr.addr3 and self.is_variable(instr.addr3):
-                    used_vars.add(instr.addr3)
+        referenciados = {
+            instr.addr1 for instr in optimized if instr.op in {"JMP", "JNZ"}
+        }
+        return [
+            instr
+            for instr in optimized
+            if instr.op != "LBL"
+            or instr.addr1 in referenciados
+            or str(instr.addr1).startswith("FUNC_")
+        ]
+
+    def _valor_constante(self, addr, constantes):
+        if isinstance(addr, Const):
+            return addr.valor
+        return constantes.get(addr)
+
+    def _dobrar(self, instr, constantes):
+        esq = self._valor_constante(instr.addr2, constantes)
+        dir = self._valor_constante(instr.addr3, constantes)
+        if esq is None or dir is None:
+            return None
+        try:
+            return avaliar_operacao(instr.op, esq, dir)
+        except ZeroDivisionError:
+            return None
+
+    def _transferir_constantes(self, instr, constantes):
+        op = instr.op
+
+        if op == "CALL":
+            for var in [v for v in constantes if not eh_temporario(v)]:
+                del constantes[var]
+            return
+
+        dest = instr.destino()
+        if dest is None:
+            return
+
+        valor = None
+        if op == "MOV" and not eh_composto(instr.addr1):
+            valor = self._valor_constante(instr.addr2, constantes)
+        elif op in OPS_BINARIAS and not eh_composto(instr.addr1):
+            valor = self._dobrar(instr, constantes)
+
+        if valor is None:
+            constantes.pop(dest, None)
+        else:
+            constantes[dest] = valor
+
+    def _sucessores_executaveis(self, cfg, bloco, constantes):
+        ultima = bloco.ultima
+        if ultima.op != "JNZ":
+            return bloco.sucessores
+
+        condicao = self._valor_constante(ultima.addr2, constantes)
+        if condicao is None:
+            return bloco.sucessores
+
+        if condicao:
+            alvo = cfg.bloco_do_rotulo.get(ultima.addr1)
+        elif bloco.indice + 1 < len(cfg.blocos):
+            alvo = cfg.blocos[bloco.indice + 1]
+        else:
+            alvo = None
+        return [alvo] if alvo is not None else []
+
+    def _encontro_constantes(self, mapas):
+        resultado = None
+        for mapa in mapas:
+            if resultado is None:
+                resultado = dict(mapa)
+                continue
+            for var in list(resultado):
+                valor = mapa.get(var)
+                if valor is None or type(valor) is not type(resultado[var]):
+                    del resultado[var]
+                elif valor != resultado[var]:
+                    del resultado[var]
+        return resultado if resultado is not None else {}
+
+    def _trocar_indice(self, addr, trocar):
+        """
+        Reescreve o índice de a[i] (também dentro de a[i].campo);
+        trocar devolve o novo índice ou None para manter o atual
+        """
+        if isinstance(addr, Index):
+            novo = trocar(addr.indice)
+            return addr if novo is None else Index(addr.base, novo)
+        if isinstance(addr, Field):
+            base = self._trocar_indice(addr.base, trocar)
+            return addr if base is addr.base else Field(base, addr.campo)
+        return addr
+
+    def _substituir_indice(self, addr, constantes):
+        def trocar(indice):
+            valor = constantes.get(indice)
+            return Const(valor) if isinstance(valor, int) else None
+
+        return self._trocar_indice(addr, trocar)
+
+    def _reescrever_constantes(self, instr, constantes):
+        op = instr.op
+
+        if op in OPS_BINARIAS:
+            dest = self._substituir_indice(instr.addr1, constantes)
+            resultado = self._dobrar(instr, constantes)
+            if resultado is not None:
+                return Instruction("MOV", dest, Const(resultado))
+
+            esq = self._valor_constante(instr.addr2, constantes)
+            dir = self._valor_constante(instr.addr3, constantes)
+            return Instruction(
+                op,
+                dest,
+                instr.addr2 if esq is None else Const(esq),
+                instr.addr3 if dir is None else Const(dir),
+            )
+
+        if op == "MOV":
+            dest = self._substituir_indice(instr.addr1, constantes)
+            valor = self._valor_constante(instr.addr2, constantes)
+            if valor is None:
+                origem = self._substituir_indice(instr.addr2, constantes)
+            else:
+                origem = Const(valor)
+            return Instruction("MOV", dest, origem)
+
+        if op in {"WRITE", "PUSH"}:
+            valor = self._valor_constante(instr.addr1, constantes)
+            if valor is not None:
+                return Instruction(op, Const(valor))
+            return instr
+
+        if op == "JNZ":
+            condicao = self._valor_constante(instr.addr2, constantes)
+            if condicao is None:
+                return instr
+            if condicao:
+                return Instruction("JMP", instr.addr1)
+            return None
+
+        return instr
+
+    def numerar_valores(self, instructions):
+        """
+        Numeração de valores para eliminar subexpressões comuns
+        Dentro de cada bloco, toda variável e toda expressão (op, vn2, vn3)
+        recebe um número de valor; uma expressão já calculada e ainda guardada
+        em alguma variável vira MOV dessa variável.
+        Entre blocos, a tabela é herdada pela árvore de dominadores, mas só
+        para expressões sobre temporários de definição única (e variáveis
+        nunca atribuídas), cujo valor não muda em nenhum caminho
+        """
+        cfg = self.obter_cfg(instructions)
+
+        definicoes = {}
+        for instr in instructions:
+            dest = instr.destino()
+            if dest is not None:
+                definicoes[dest] = definicoes.get(dest, 0) + 1
+
+        optimized = list(instructions)
+        for entrada in cfg.entradas:
+            pilha = [(entrada, ChainMap())]
+            while pilha:
+                bloco, escopo = pilha.pop()
+                self._numerar_bloco(optimized, bloco, escopo, definicoes)
+                for filho in cfg.filhos_dominancia[bloco.indice]:
+                    pilha.append((filho, escopo.new_child()))
 
-        necessary = [False] * len(instructions)
+        return optimized
 
-        for i, instr in enumerate(instructions):
+    def _numerar_bloco(self, instructions, bloco, escopo, definicoes):
+        numeros = {}
+        portadores = {}
+        tabela = {}
+        cargas = {}
+        novos = count()
+
+        definidos_fora = self.definidos_fora
+
+        def estavel(var):
+            if var in definidos_fora:
+                return False
+            n_defs = definicoes.get(var, 0)
+            return n_defs == 0 or (n_defs == 1 and eh_temporario(var))
+
+        def valor(addr):
+            if isinstance(addr, Const):
+                return ("c", type(addr.valor).__name__, addr.valor)
+            if addr in numeros:
+                return numeros[addr]
+            if estavel(addr):
+                return ("v", addr)
+            vn = ("n", next(novos))
+            definir(addr, vn)
+            return vn
+
+        def definir(var, vn):
+            anterior = numeros.get(var)
+            if anterior is not None:
+                portadores[anterior].discard(var)
+            numeros[var] = vn
+            portadores.setdefault(vn, set()).add(var)
+
+        def portador(vn):
+            if vn[0] == "v":
+                return vn[1]
+            vivos = portadores.get(vn)
+            if vivos:
+                return next(iter(vivos))
+            return None
+
+        def invalidar_cargas(base):
+            for chave in cargas.pop(base, ()):
+                tabela.pop(chave, None)
+
+        def ordem(vn):
+            return ("v", str(vn[1])) if vn[0] == "v" else vn
+
+        def estrutura(addr):
+            if isinstance(addr, Index):
+                return ("[]", addr.base, valor(addr.indice))
+            if isinstance(addr, Field):
+                return (".", estrutura(addr.base), addr.campo)
+            return addr
+
+        def chave_carga(addr):
+            base = variaveis_endereco(addr)[0]
+            return base, ("LOAD", estrutura(addr))
+
+        for i in range(bloco.inicio, bloco.fim):
+            instr = instructions[i]
             op = instr.op
+            dest = instr.destino()
+
+            if op in OPS_BINARIAS and not eh_composto(instr.addr1):
+                esq, dir = valor(instr.addr2), valor(instr.addr3)
+                if op in {"ADD", "MUL", "EQL", "NEQ"} and ordem(dir) < ordem(esq):
+                    esq, dir = dir, esq
+                chave = (op, esq, dir)
+
+                vn = tabela.get(chave)
+                if vn is None:
+                    vn = escopo.get(chave)
+                origem = portador(vn) if vn is not None else None
+
+                if origem is not None and origem != dest:
+                    instructions[i] = Instruction("MOV", dest, origem)
+                    definir(dest, vn)
+                    continue
 
-            if op in preserve_ops:
-                necessary[i] = True
+                vn = ("v", dest) if estavel(dest) else ("n", next(novos))
+                definir(dest, vn)
+                tabela[chave] = vn
+                if vn[0] == "v" and esq[0] != "n" and dir[0] != "n":
+                    escopo[chave] = vn
+
+            elif op == "MOV" and not eh_composto(instr.addr1):
+                if eh_composto(instr.addr2):
+                    base, chave = chave_carga(instr.addr2)
+                    vn = tabela.get(chave)
+                    origem = portador(vn) if vn is not None else None
+                    if origem is not None and origem != dest:
+                        instructions[i] = Instruction("MOV", dest, origem)
+                        definir(dest, vn)
+                        continue
+
+                    vn = ("n", next(novos))
+                    definir(dest, vn)
+                    tabela[chave] = vn
+                    cargas.setdefault(base, []).append(chave)
+                else:
+                    definir(dest, valor(instr.addr2))
+                invalidar_cargas(dest)
+
+            elif op == "CALL":
+                for var in [v for v in numeros if not eh_temporario(v)]:
+                    definir(var, ("n", next(novos)))
+                for base in list(cargas):
+                    invalidar_cargas(base)
+
+            elif dest is not None:
+                if not eh_composto(instr.addr1):
+                    definir(dest, ("n", next(novos)))
+                invalidar_cargas(dest)
+
+    def propagar_copias(self, instructions):
+        """
+        Propagação de cópias
+        Depois de MOV x y (y variável simples ou literal), leituras de x no
+        mesmo bloco passam a ler y até que x ou y sejam redefinidos.
+        Temporários de definição única copiados de um literal ou de outro
+        nome que nunca muda são substituídos em todo o código.
+        As atribuições que ficam sem uso saem na eliminação de código morto
+        """
+        cfg = self.obter_cfg(instructions)
+
+        definicoes = {}
+        for instr in instructions:
+            dest = instr.destino()
+            if dest is not None:
+                definicoes[dest] = definicoes.get(dest, 0) + 1
+
+        def estavel(addr):
+            if isinstance(addr, Const):
+                return True
+            if addr in self.definidos_fora:
+                return False
+            n_defs = definicoes.get(addr, 0)
+            return n_defs == 0 or (n_defs == 1 and eh_temporario(addr))
+
+        globais = {}
+        for instr in instructions:
+            if (
+                instr.op == "MOV"
+                and eh_temporario(instr.addr1)
+                and definicoes[instr.addr1] == 1
+                and not eh_composto(instr.addr2)
+                and estavel(instr.addr2)
+            ):
+                globais[instr.addr1] = instr.addr2
+
+        for temp in list(globais):
+            origem = globais[temp]
+            vistos = {temp}
+            while origem in globais and origem not in vistos:
+                vistos.add(origem)
+                origem = globais[origem]
+            globais[temp] = origem
 
-            elif op in {"MOV", "ADD", "SUB", "MUL", "DIV", "GTR", "LES", "EQL", "NEQ"}:
-                dest = instr.addr1
-                if dest and dest in used_vars:
-                    necessary[i] = True
+        optimized = []
+        for bloco in cfg.blocos:
+            copias = dict(globais)
+            copiado_de = {}
+
+            def matar(var):
+                if var in copias and var not in globais:
+                    fonte = copias.pop(var)
+                    copiado_de.get(fonte, set()).discard(var)
+                for destino in copiado_de.pop(var, ()):
+                    copias.pop(destino, None)
+
+            for i in range(bloco.inicio, bloco.fim):
+                instr = self._substituir_copias(instructions[i], copias)
+                optimized.append(instr)
+
+                if instr.op == "CALL":
+                    for var in [v for v in copias if v not in globais]:
+                        if not eh_temporario(var) or not eh_temporario(copias[var]):
+                            matar(var)
+                    continue
 
-        changed = True
-        while changed:
-            changed = False
-            for i, instr in enumerate(instructions):
-                if not necessary[i]:
+                dest = instr.destino()
+                if dest is None:
                     continue
+                matar(dest)
+
+                if (
+                    instr.op == "MOV"
+                    and not eh_composto(instr.addr1)
+                    and not eh_composto(instr.addr2)
+                    and instr.addr2 != dest
+                ):
+                    copias[dest] = instr.addr2
+                    if eh_variavel(instr.addr2):
+                        copiado_de.setdefault(instr.addr2, set()).add(dest)
 
+        return optimized
+
+    def _substituir_copias(self, instr, copias):
+        def simples(addr):
+            if addr in copias:
+                return copias[addr]
+            return addr
+
+        def trocar(indice):
+            novo = copias.get(indice)
+            if isinstance(novo, Const) and isinstance(novo.valor, float):
+                return None
+            return novo
+
+        def composto(addr):
+            return self._trocar_indice(addr, trocar)
+
+        op = instr.op
+        if op in OPS_BINARIAS:
+            novos = (composto(instr.addr1), simples(instr.addr2), simples(instr.addr3))
+        elif op == "MOV":
+            if eh_composto(instr.addr2):
+                origem = composto(instr.addr2)
+            else:
+                origem = simples(instr.addr2)
+            novos = (composto(instr.addr1), origem, None)
+        elif op in {"WRITE", "PUSH"}:
+            novos = (simples(instr.addr1), None, None)
+        elif op == "JNZ":
+            novos = (instr.addr1, simples(instr.addr2), None)
+        else:
+            return instr
+
+        if novos == (instr.addr1, instr.addr2, instr.addr3):
+            return instr
+        return Instruction(op, *novos)
+
+    def mover_invariantes(self, instructions):
+        """
+        Movimentação de código invariante de laço
+        Laços são tratados do mais interno para o mais externo; a cada
+        movimentação o CFG é refeito, o que permite que um invariante já
+        levado para o pré-cabeçalho de um laço interno suba mais um nível
+        """
+        while True:
+            cfg = self.obter_cfg(instructions)
+
+            for laco in cfg.lacos:
+                posicao = self._pre_cabecalho(cfg, laco)
+                if posicao is None:
+                    continue
+
+                movidas = self._invariantes_do_laco(cfg, laco)
+                if not movidas:
+                    continue
+
+                hoisted = [instructions[i] for i in movidas]
+                movidas = set(movidas)
+                instructions = (
+                    [instr for instr in instructions[:posicao]]
+                    + hoisted
+                    + [
+                        instr
+                        for i, instr in enumerate(instructions)
+                        if i >= posicao and i not in movidas
+                    ]
+                )
+                break
+            else:
+                return instructions
+
+    def _pre_cabecalho(self, cfg, laco):
+        """
+        Posição em que o pré-cabeçalho pode ser aberto: logo antes do rótulo
+        do cabeçalho, se o laço só é alcançado de fora por fluxo sequencial
+        """
+        cabecalho = laco.cabecalho
+        externos = [p for p in cabecalho.predecessores if p not in laco]
+
+        if not externos:
+            return cabecalho.inicio if cabecalho in cfg.entradas else None
+
+        if len(externos) != 1 or externos[0].indice != cabecalho.indice - 1:
+            return None
+
+        ultima = externos[0].ultima
+        if ultima.op in {"JMP", "JNZ"} and ultima.addr1 == cabecalho.rotulo:
+            return None
+
+        return cabecalho.inicio
+
+    def _invariantes_do_laco(self, cfg, laco):
+        instructions = cfg.instructions
+        vivacidade = cfg.vivacidade
+        blocos = sorted(laco.blocos)
+
+        definicoes = {}
+        bases_escritas = set()
+        tem_chamada = False
+        for indice in blocos:
+            bloco = cfg.blocos[indice]
+            for i in range(bloco.inicio, bloco.fim):
+                instr = instructions[i]
+                if instr.op == "CALL":
+                    tem_chamada = True
+                dest = instr.destino()
+                if dest is not None:
+                    definicoes[dest] = definicoes.get(dest, 0) + 1
+                    if eh_composto(instr.addr1):
+                        bases_escritas.add(dest)
+
+        vivas_na_saida = 0
+        for indice in blocos:
+            for suc in cfg.blocos[indice].sucessores:
+                if suc not in laco:
+                    vivas_na_saida |= vivacidade.entrada[suc.indice]
+
+        invariantes = set()
+
+        def invariante(addr):
+            if not eh_variavel(addr):
+                return True
+            if eh_composto(addr):
+                variaveis = variaveis_endereco(addr)
+                if tem_chamada or variaveis[0] in bases_escritas:
+                    return False
+                return all(invariante(var) for var in variaveis)
+            if addr in invariantes:
+                return True
+            if tem_chamada and not eh_temporario(addr):
+                return False
+            return definicoes.get(addr, 0) == 0
+
+        movidas = []
+        mudou = True
+        while mudou:
+            mudou = False
+            for indice in blocos:
+                bloco = cfg.blocos[indice]
+                for i in range(bloco.inicio, bloco.fim):
+                    instr = instructions[i]
+                    dest = instr.addr1
+
+                    if instr.op not in {"ADD", "SUB", "MUL", "DIV", "MOV"}:
+                        continue
+                    if dest in invariantes or eh_composto(dest):
+                        continue
+                    if definicoes.get(dest) != 1:
+                        continue
+                    if tem_chamada and not eh_temporario(dest):
+                        continue
+
+                    # Sem bit, dest nunca está vivo na fronteira de um bloco
+                    bit = vivacidade.bits.get(dest, 0)
+                    if vivacidade.entrada[laco.cabecalho.indice] & bit:
+                        continue
+                    if vivas_na_saida & bit:
+                        continue
+                    if instr.op == "DIV" and (
+                        not isinstance(instr.addr3, Const) or instr.addr3.valor == 0
+                    ):
+                        continue
+                    if not (invariante(instr.addr2) and invariante(instr.addr3)):
+                        continue
+
+                    invariantes.add(dest)
+                    movidas.append(i)
+                    mudou = True
+
+        return sorted(movidas)
+
+    def coalescer_temporarios(self, instructions):
+        """
+        Coalescência de temporários
+        OP TEMPn ... seguido, no mesmo bloco, de MOV x TEMPn (o único uso
+        de TEMPn) vira OP x ..., desde que nada entre as duas instruções
+        leia ou escreva x
+        """
+        cfg = self.obter_cfg(instructions)
+
+        definicoes = {}
+        usos = {}
+        for instr in instructions:
+            dest = instr.destino()
+            if dest is not None:
+                definicoes[dest] = definicoes.get(dest, 0) + 1
+            for var in instr.usos():
+                usos[var] = usos.get(var, 0) + 1
+
+        substituidas = {}
+        removidas = set()
+
+        for bloco in cfg.blocos:
+            pendentes = {}
+            ultimo_acesso = {}
+            ultima_chamada = -1
+
+            for i in range(bloco.inicio, bloco.fim):
+                instr = instructions[i]
                 op = instr.op
 
-                new_used = set()
-
-                if op in {"MOV"}:
-                    if instr.addr2 and self.is_variable(instr.addr2):
-                        new_used.add(instr.addr2)
-
-                elif op in {"ADD", "SUB", "MUL", "DIV", "GTR", "LES", "EQL", "NEQ"}:
-                    if instr.addr2 and self.is_variable(instr.addr2):
-                        new_used.add(instr.addr2)
-                    if instr.addr3 and self.is_variable(instr.addr3):
-                        new_used.add(instr.addr3)
-
-                for var in new_used:
-                    if var not in used_vars:
-                        used_vars.add(var)
-                        changed = True
-
-                        for j, instr2 in enumerate(instructions):
-                            if not necessary[j]:
-                                if instr2.op in {
-                                    "MOV",
-                                    "ADD",
-                                    "SUB",
-                                    "MUL",
-                                    "DIV",
-                                    "GTR",
-                                    "LES",
-                                    "EQL",
-                                    "NEQ",
-                                }:
-                                    if instr2.addr1 == var:
-                                        necessary[j] = True
+                if (
+                    op == "MOV"
+                    and instr.addr2 in pendentes
+                    and eh_variavel(instr.addr1)
+                    and not eh_composto(instr.addr1)
+                ):
+                    alvo = instr.addr1
+                    j = pendentes.pop(instr.addr2)
+                    livre = ultimo_acesso.get(alvo, -1) <= j
+                    if not eh_temporario(alvo):
+                        livre = livre and ultima_chamada < j
+                    if livre:
+                        definicao = instructions[j]
+                        substituidas[j] = Instruction(
+                            definicao.op, alvo, definicao.addr2, definicao.addr3
+                        )
+                        removidas.add(i)
+                        ultimo_acesso[alvo] = i
+                        continue
+
+                if op == "CALL":
+                    ultima_chamada = i
+                for var in instr.usos():
+                    ultimo_acesso[var] = i
+
+                dest = instr.destino()
+                if dest is None:
+                    continue
+                ultimo_acesso[dest] = i
+
+                if (
+                    (op in OPS_ATRIBUICAO or op == "POP")
+                    and eh_temporario(instr.addr1)
+                    and definicoes.get(dest) == 1
+                    and usos.get(dest) == 1
+                ):
+                    pendentes[dest] = i
+
+        return [
+            substituidas.get(i, instr)
+            for i, instr in enumerate(instructions)
+            if i not in removidas
+        ]
+
+    def eliminar_codigo_morto(self, instructions):
+        """
+        Eliminação de código morto por lista de trabalho
+        Instruções com efeito colateral são vivas, assim como atribuições a
+        variáveis lidas por outros fragmentos; cada variável lida por uma
+        instrução viva torna vivas todas as suas definições.
+        O índice de definições é montado em uma passada e cada variável é
+        expandida uma única vez, então o custo é linear no tamanho do código
+        """
+        necessary = [False] * len(instructions)
+        definicoes = {}
+        worklist = []
+        lidos_fora = self.lidos_fora
 
-        optimized = []
         for i, instr in enumerate(instructions):
-            if necessary[i]:
-                optimized.append(instr)
+            op = instr.op
 
-        return optimized
+            if op in OPS_PRESERVADAS:
+                necessary[i] = True
+                worklist.append(i)
 
-    def is_variable(self, addr):
-        if addr is None:
-            return False
+            elif op in OPS_ATRIBUICAO:
+                dest = instr.destino()
+                if dest in lidos_fora:
+                    necessary[i] = True
+                    worklist.append(i)
+                elif dest is not None:
+                    definicoes.setdefault(dest, []).append(i)
 
-        addr_str = str(addr)
+        used_vars = set()
 
-        if addr_str.startswith('"') or addr_str.startswith("'"):
-            return False
-        try:
-            float(addr_str)
-            return False
-        except ValueError:
-            pass
+        while worklist:
+            instr = instructions[worklist.pop()]
 
-        # É uma variável
-        return True
+            for var in instr.usos():
+                if var in used_vars:
+                    continue
+                used_vars.add(var)
+
+                for j in definicoes.get(var, ()):
+                    if not necessary[j]:
+                        necessary[j] = True
+                        worklist.append(j)
+
+        return [instr for i, instr in enumerate(instructions) if necessary[i]]
+
+    def eliminar_atribuicoes_mortas(self, instructions):
+        """
+        Eliminação de atribuições mortas guiada por vivacidade
+        Cada bloco é percorrido de trás para frente a partir das variáveis
+        vivas na saída (ver LivenessAnalysis.atribuicoes_mortas). Repete
+        enquanto houver remoções, pois remover um uso em um bloco pode matar
+        definições em outro
+        """
+        while True:
+            cfg = self.obter_cfg(instructions)
+            vivacidade = cfg.vivacidade
+            mortas = set()
+
+            for bloco in cfg.blocos:
+                mortas.update(vivacidade.atribuicoes_mortas(bloco))
+
+            if not mortas:
+                return instructions
+
+            instructions = [
+                instr for i, instr in enumerate(instructions) if i not in mortas
+            ]
 
     def imprimir_estatisticas(self):
         print("\n" + "=" * 70)
@@ -178,8 +941,10 @@ class Optimizer:
         print("=" * 70)
 
 
-def otimizar_codigo(instructions, verbose=True, comparar=False):
-    otimizador = Optimizer()
+def otimizar_codigo(
+    instructions, verbose=True, comparar=False, fragmentos=None, perfil=INATIVO
+):
+    otimizador = Optimizer(fragmentos, perfil)
     otimizado = otimizador.otimizar(instructions)
 
     if verbose:
@@ -1,77 +1,126 @@
 import ply.yacc as yacc
+import hashlib
 import sys
 import os
+import threading
 
 sys.path.insert(0, os.path.dirname(__file__))
 
-from lexer import tokens, lexer
-
-errors = []
+from cache import diretorio_cache
+from lexer import comprimento_token, tokens, obter_lexer
+from posicoes import MapaLinhas
+from ast_nodes import (
+    Array,
+    ArrayAccess,
+    Atribuicao,
+    ChamadaFuncao,
+    Constante,
+    Corpo,
+    DefConst,
+    DefTipos,
+    DefVar,
+    Else,
+    FieldAccess,
+    Funcao,
+    Identificador,
+    If,
+    Numero,
+    OpArit,
+    OpComp,
+    Parametro,
+    Programa,
+    Read,
+    Record,
+    Texto,
+    Tipo,
+    Variavel,
+    While,
+    Write,
+)
 
 start = "programa"
 
 
+def posicao(p, i):
+    """
+    (início, comprimento) do i-ésimo símbolo da produção, que deve ser um
+    token
+    """
+    return p.lexpos(i), comprimento_token(p.slice[i])
+
+
+def abrangencia(primeiro, ultimo):
+    """
+    (início, comprimento) do trecho que vai do nó primeiro ao nó ultimo
+    """
+    return primeiro.inicio, ultimo.inicio + ultimo.comprimento - primeiro.inicio
+
+
 def p_programa(p):
     """programa : PROGRAM ID SEMICOLON corpo"""
-    p[0] = ("PROGRAMA", p[2], p[4])
-    print(f"Programa '{p[2]}' reconhecido com sucesso")
+    p[0] = Programa(p[2], p[4], *posicao(p, 1))
 
 
 def p_corpo(p):
     """corpo : def_const def_tipos def_var lista_func BEGIN lista_comandos END"""
-    p[0] = ("CORPO", p[1], p[2], p[3], p[4], p[6])
+    p[0] = Corpo(p[1], p[2], p[3], p[4], p[6], *posicao(p, 5))
 
 
 def p_def_const(p):
     """def_const : CONST lista_const
     |"""
     if len(p) == 3:
-        p[0] = ("DEF_CONST", p[2])
+        p[0] = DefConst(p[2], *posicao(p, 1))
     else:
         p[0] = None
 
 
 def p_lista_const(p):
-    """lista_const : constante lista_const
+    """lista_const : lista_const constante
     | constante"""
     if len(p) == 3:
-        p[0] = [p[1]] + (p[2] if isinstance(p[2], list) else [p[2]])
+        p[1].append(p[2])
+        p[0] = p[1]
     else:
         p[0] = [p[1]]
 
 
 def p_constante(p):
     """constante : ID ASSIGN const_valor SEMICOLON"""
-    p[0] = ("CONSTANTE", p[1], p[3])
+    p[0] = Constante(p[1], p[3], *posicao(p, 1))
 
 
 def p_const_valor(p):
     """const_valor : STRING
     | NUMBER"""
-    p[0] = p[1]
+    if p.slice[1].type == "STRING":
+        p[0] = Texto(p[1], *posicao(p, 1))
+    else:
+        p[0] = Numero(p[1], *posicao(p, 1))
 
 
 def p_def_tipos(p):
     """def_tipos : TYPE lista_tipos
     |"""
     if len(p) == 3:
-        p[0] = ("DEF_TIPOS", p[2])
+        p[0] = DefTipos(p[2], *posicao(p, 1))
     else:
         p[0] = None
 
 
 def p_lista_tipos(p):
-    """lista_tipos : tipo SEMICOLON lista_tipos
+    """lista_tipos : lista_tipos tipo SEMICOLON
     | tipo SEMICOLON"""
     if len(p) == 4:
-        p[0] = [p[1]] + (p[3] if isinstance(p[3], list) else [])
+        p[1].append(p[2])
+        p[0] = p[1]
     else:
         p[0] = [p[1]]
 
 
 def p_tipo(p):
     """tipo : ID ASSIGN tipo_dado"""
-    p[0] = ("TIPO", p[1], p[3])
+    p[0] = Tipo(p[1], p[3], *posicao(p, 1))
 
 
 def p_tipo_dado(p):
@@ -83,153 +132,168 @@ def p_tipo_dado(p):
     if len(p) == 2:
         p[0] = p[1]
     elif len(p) == 4:
-        p[0] = ("RECORD", p[2])
+        p[0] = Record(p[2], *posicao(p, 1))
     else:
-        p[0] = ("ARRAY", p[3], p[6])
+        p[0] = Array(p[3], p[6], *posicao(p, 1))
 
 
 def p_def_var(p):
     """def_var : VAR lista_var
     |"""
     if len(p) == 3:
-        p[0] = ("DEF_VAR", p[2])
+        p[0] = DefVar(p[2], *posicao(p, 1))
     else:
         p[0] = None
 
 
 def p_lista_var(p):
-    """lista_var : variavel SEMICOLON lista_var
+    """lista_var : lista_var variavel SEMICOLON
     | variavel SEMICOLON"""
     if len(p) == 4:
-        p[0] = [p[1]] + (p[3] if isinstance(p[3], list) else [])
+        p[1].append(p[2])
+        p[0] = p[1]
     else:
         p[0] = [p[1]]
 
 
 def p_variavel(p):
     """variavel : lista_id COLON tipo_dado"""
-    p[0] = ("VARIAVEL", p[1], p[3])
+    p[0] = Variavel(p[1], p[3], *posicao(p, 2))
 
 
 def p_lista_id(p):
-    """lista_id : ID COMMA lista_id
+    """lista_id : lista_id COMMA ID
     | ID"""
     if len(p) == 4:
-        p[0] = [p[1]] + p[3]
+        p[1].append(p[3])
+        p[0] = p[1]
     else:
         p[0] = [p[1]]
 
 
 def p_lista_func(p):
-    """lista_func : funcao lista_func
+    """lista_func : lista_func funcao
     |"""
     if len(p) == 3:
-        p[0] = [p[1]] + (p[2] if isinstance(p[2], list) else [])
+        p[1].append(p[2])
+        p[0] = p[1]
     else:
         p[0] = []
 
 
 def p_funcao(p):
     """funcao : FUNCTION ID LPAREN lista_param RPAREN COLON tipo_dado def_var BEGIN lista_comandos END"""
-    p[0] = ("FUNCAO", p[2], p[4], p[7], p[8], p[10])
+    p[0] = Funcao(p[2], p[4], p[7], p[8], p[10], *posicao(p, 1))
 
 
 def p_lista_param(p):
-    """lista_param : param_decl
-    | param_decl SEMICOLON lista_param
+    """lista_param : sequencia_param
+    | sequencia_param SEMICOLON
     |"""
+    p[0] = p[1] if len(p) > 1 else []
+
+
+def p_sequencia_param(p):
+    """sequencia_param : sequencia_param SEMICOLON param_decl
+    | param_decl"""
     if len(p) == 4:
-        p[0] = [p[1]] + p[3]
-    elif len(p) == 2 and p[1]:
-        p[0] = [p[1]]
+        p[1].append(p[3])
+        p[0] = p[1]
     else:
-        p[0] = []
+        p[0] = [p[1]]
 
 
 def p_param_decl(p):
     """param_decl : lista_id COLON tipo_dado"""
-    p[0] = ("PARAMETRO", p[1], p[3])
+    p[0] = Parametro(p[1], p[3], *posicao(p, 2))
 
 
 def p_lista_comandos(p):
-    """lista_comandos : comando SEMICOLON lista_comandos
-    | comando
+    """lista_comandos : sequencia_comandos
+    | sequencia_comandos SEMICOLON
     |"""
+    p[0] = p[1] if len(p) > 1 else []
+
+
+def p_sequencia_comandos(p):
+    """sequencia_comandos : sequencia_comandos SEMICOLON comando
+    | comando"""
     if len(p) == 4:
-        p[0] = [p[1]] + (p[3] if isinstance(p[3], list) else [])
-    elif len(p) == 2 and p[1]:
-        p[0] = [p[1]]
+        p[1].append(p[3])
+        p[0] = p[1]
     else:
-        p[0] = []
+        p[0] = [p[1]]
 
 
 def p_comando_atrib(p):
     """comando : lvalue ASSIGN expressao"""
-    p[0] = ("ATRIBUICAO", p[1], p[3])
+    p[0] = Atribuicao(p[1], p[3], *posicao(p, 2))
 
 
 def p_comando_while(p):
     """comando : WHILE expressao BEGIN lista_comandos END"""
-    p[0] = ("WHILE", p[2], p[4])
+    p[0] = While(p[2], p[4], *posicao(p, 1))
 
 
 def p_comando_if(p):
     """comando : IF expressao THEN BEGIN lista_comandos END else_parte"""
-    p[0] = ("IF", p[2], p[5], p[7])
+    p[0] = If(p[2], p[5], p[7], *posicao(p, 1))
 
 
 def p_comando_write_string(p):
     """comando : WRITE LPAREN STRING RPAREN"""
-    p[0] = ("WRITE", p[3])
+    p[0] = Write(Texto(p[3], *posicao(p, 3)), *posicao(p, 1))
 
 
 def p_comando_write_expr(p):
     """comando : WRITE LPAREN expressao RPAREN"""
-    p[0] = ("WRITE", p[3])
+    p[0] = Write(p[3], *posicao(p, 1))
 
 
 def p_comando_read(p):
     """comando : READ LPAREN ID RPAREN"""
-    p[0] = ("READ", p[3])
+    p[0] = Read(p[3], *posicao(p, 1))
 
 
 def p_else_parte(p):
     """else_parte : ELSE BEGIN lista_comandos END
     |"""
     if len(p) == 5:
-        p[0] = ("ELSE", p[3])
+        p[0] = Else(p[3], *posicao(p, 1))
     else:
         p[0] = None
 
 
 def p_lvalue_id(p):
     """lvalue : ID"""
-    p[0] = p[1]
+    p[0] = Identificador(p[1], *posicao(p, 1))
 
 
 def p_lvalue_array(p):
     """lvalue : ID LBRACKET expressao RBRACKET"""
-    p[0] = ("ARRAY_ACCESS", p[1], p[3])
+    p[0] = ArrayAccess(p[1], p[3], *posicao(p, 1))
 
 
 def p_lvalue_field(p):
     """lvalue : ID DOT ID"""
-    p[0] = ("FIELD_ACCESS", p[1], p[3])
+    p[0] = FieldAccess(p[1], p[3], *posicao(p, 1))
 
 
 def p_lvalue_array_field(p):
     """lvalue : ID LBRACKET expressao RBRACKET DOT ID"""
-    p[0] = ("FIELD_ACCESS", ("ARRAY_ACCESS", p[1], p[3]), p[6])
+    inicio, comprimento = posicao(p, 1)
+    acesso = ArrayAccess(p[1], p[3], inicio, comprimento)
+    p[0] = FieldAccess(acesso, p[6], inicio, comprimento)
 
 
 def p_expressao_comp(p):
     """expressao : expressao op_comp expressao"""
-    p[0] = ("OP_COMP", p[2], p[1], p[3])
+    p[0] = OpComp(p[2], p[1], p[3], *abrangencia(p[1], p[3]))
 
 
 def p_expressao_arit(p):
     """expressao : expressao op_arit expressao"""
-    p[0] = ("OP_ARIT", p[2], p[1], p[3])
+    p[0] = OpArit(p[2], p[1], p[3], *abrangencia(p[1], p[3]))
 
 
 def p_expressao_prim(p):
@@ -239,39 +303,44 @@ def p_expressao_prim(p):
 
 def p_primario_numero(p):
     """primario : NUMBER"""
-    p[0] = p[1]
+    p[0] = Numero(p[1], *posicao(p, 1))
 
 
 def p_primario_id(p):
     """primario : ID"""
-    p[0] = p[1]
+    p[0] = Identificador(p[1], *posicao(p, 1))
 
 
 def p_primario_array(p):
     """primario : ID LBRACKET expressao RBRACKET"""
-    p[0] = ("ARRAY_ACCESS", p[1], p[3])
+    p[0] = ArrayAccess(p[1], p[3], *posicao(p, 1))
 
 
 def p_primario_field(p):
     """primario : ID DOT ID"""
-    p[0] = ("FIELD_ACCESS", p[1], p[3])
+    p[0] = FieldAccess(p[1], p[3], *posicao(p, 1))
 
 
 def p_primario_call(p):
     """primario : ID LPAREN lista_args RPAREN"""
-    p[0] = ("CHAMADA_FUNCAO", p[1], p[3])
+    p[0] = ChamadaFuncao(p[1], p[3], *posicao(p, 1))
 
 
 def p_lista_args(p):
-    """lista_args : expressao COMMA lista_args
-    | expressao
+    """lista_args : sequencia_args
+    | sequencia_args COMMA
     |"""
+    p[0] = p[1] if len(p) > 1 else []
+
+
+def p_sequencia_args(p):
+    """sequencia_args : sequencia_args COMMA expressao
+    | expressao"""
     if len(p) == 4:
-        p[0] = [p[1]] + p[3]
-    elif len(p) == 2 and p[1]:
-        p[0] = [p[1]]
+        p[1].append(p[3])
+        p[0] = p[1]
     else:
-        p[0] = []
+        p[0] = [p[1]]
 
 
 def p_op_comp(p):
@@ -297,58 +366,154 @@ precedence = (
 )
 
 
-def p_error(p):
-    global errors
-    if p:
-        error_msg = (
-            f"Erro sintático na linha {p.lineno}: "
-            f"Token inesperado '{p.value}' (tipo: {p.type})"
-        )
-        errors.append(error_msg)
-        print(f"{error_msg}")
+_tabelas = None
+_trava_tabelas = threading.Lock()
 
-        parser.errok()
-    else:
-        error_msg = "Erro sintático: fim de arquivo inesperado"
-        errors.append(error_msg)
-        print(f"{error_msg}")
 
+def arquivo_tabelas():
+    """
+    Caminho das tabelas LALR em cache, nomeado pelo hash da gramática
+    O hash cobre a mesma assinatura que o PLY compara (símbolo inicial,
+    precedência, tokens e regras) e a versão do formato das tabelas, então
+    uma gramática alterada gera um arquivo novo em vez de reaproveitar um
+    antigo
+    """
+    gramatica = yacc.ParserReflect(globals())
+    gramatica.get_all()
+    assinatura = f"{yacc.__tabversion__}\n{gramatica.signature()}"
+    resumo = hashlib.sha256(assinatura.encode("utf-8")).hexdigest()[:16]
+    return diretorio_cache("tabelas") / f"parsetab_{resumo}.pickle"
 
-parser = yacc.yacc()
 
+def obter_tabelas():
+    """
+    Tabelas LALR compartilhadas por todas as sessões, carregadas do cache
+    no primeiro uso; só na primeira execução com uma gramática nova elas são
+    geradas. As tabelas não mudam depois de montadas
+    """
+    global _tabelas
+    with _trava_tabelas:
+        if _tabelas is None:
+            arquivo = arquivo_tabelas()
+            if arquivo.exists():
+                modelo = _construir(arquivo)
+            else:
+                # Gera em um arquivo próprio do processo e renomeia, para que
+                # outro processo nunca leia tabelas escritas pela metade
+                temporario = arquivo.with_name(f"{arquivo.name}.{os.getpid()}")
+                modelo = _construir(temporario)
+                if temporario.exists():
+                    os.replace(temporario, arquivo)
+            tabelas = yacc.LRTable()
+            tabelas.lr_productions = modelo.productions
+            tabelas.lr_action = modelo.action
+            tabelas.lr_goto = modelo.goto
+            _tabelas = tabelas
+    return _tabelas
 
-def parse(data, debug=False):
-    global errors
-    errors = []
 
-    lexer.lineno = 1
-    result = parser.parse(data, lexer=lexer, debug=debug)
+def p_error(p):
+    # Só para o yacc não reclamar ao gerar as tabelas; os erros de cada
+    # análise são tratados por ParseSession.erro
+    pass
 
-    if errors:
-        print(f"\n{len(errors)} erro(s) sintático(s) encontrado(s)")
-        return None
-    else:
-        print("\nAnálise sintática concluída com sucesso!")
-        return result
 
+def _construir(arquivo):
+    return yacc.yacc(
+        picklefile=str(arquivo),
+        optimize=1,
+        write_tables=True,
+        debug=False,
+    )
 
-def parse_file(filename):
-    try:
-        with open(filename, "r", encoding="utf-8") as f:
-            data = f.read()
 
-        print(f"\n{'='*70}")
-        print(f"Análise Sintática do arquivo: {filename}")
-        print(f"{'='*70}\n")
+class ParseSession:
+    """
+    Uma análise sintática independente
+    Cada sessão tem o próprio lexer (clone do lexer do módulo), a própria
+    lista de erros e o próprio estado de parser; só as tabelas LALR são
+    compartilhadas. Sessões distintas podem rodar ao mesmo tempo em threads
+    diferentes
+    """
+
+    def __init__(self):
+        self.lexer = obter_lexer().clone()
+        self.parser = yacc.LRParser(obter_tabelas(), self.erro)
+        self.erros = []
+        self.linhas = None
+
+    def erro(self, p):
+        if p:
+            _, coluna = self.linhas.linha_coluna(p.lexpos)
+            error_msg = (
+                f"Erro sintático na linha {p.lineno}, coluna {coluna}: "
+                f"Token inesperado '{p.value}' (tipo: {p.type})"
+            )
+            self.erros.append(error_msg)
+            print(f"{error_msg}")
+
+            self.parser.errok()
+        else:
+            error_msg = "Erro sintático: fim de arquivo inesperado"
+            self.erros.append(error_msg)
+            print(f"{error_msg}")
+
+    def analisar(self, data, debug=False, tokens=None, verbose=True):
+        """
+        Analisa data; com tokens (um lexer.BufferTokens de data), o parser
+        consome os tokens já lidos em vez de tokenizar a entrada de novo.
+        Sem verbose, só os erros são impressos
+        """
+        self.erros = []
+        self.linhas = MapaLinhas(data)
+
+        self.lexer.lineno = 1
+        tokenfunc = tokens.funcao_token() if tokens is not None else None
+        result = self.parser.parse(
+            data, lexer=self.lexer, debug=debug, tokenfunc=tokenfunc
+        )
 
-        result = parse(data)
+        if verbose and result is not None:
+            print(f"Programa '{result.nome}' reconhecido com sucesso")
 
-        print(f"\n{'='*70}")
-        if result:
-            print("Status: SUCESSO")
+        if self.erros:
+            print(f"\n{len(self.erros)} erro(s) sintático(s) encontrado(s)")
+            return None
         else:
-            print("Status: FALHA")
-        print(f"{'='*70}\n")
+            if verbose:
+                print("\nAnálise sintática concluída com sucesso!")
+            return result
+
+
+def parse(data, debug=False, tokens=None, verbose=True):
+    return ParseSession().analisar(data, debug, tokens, verbose)
+
+
+def parse_file(filename, data=None, tokens=None, verbose=True):
+    """
+    Analisa um arquivo; data (o conteúdo já lido) e tokens (BufferTokens
+    desse conteúdo) evitam ler e tokenizar o arquivo de novo. Sem verbose,
+    os cabeçalhos e o status não são impressos, só os erros
+    """
+    try:
+        if data is None:
+            with open(filename, "r", encoding="utf-8") as f:
+                data = f.read()
+
+        if verbose:
+            print(f"\n{'='*70}")
+            print(f"Análise Sintática do arquivo: {filename}")
+            print(f"{'='*70}\n")
+
+        result = parse(data, tokens=tokens, verbose=verbose)
+
+        if verbose:
+            print(f"\n{'='*70}")
+            if result:
+                print("Status: SUCESSO")
+            else:
+                print("Status: FALHA")
+            print(f"{'='*70}\n")
 
         return result
 
@@ -0,0 +1,39 @@
+from bisect import bisect_right
+
+
+class MapaLinhas:
+    """
+    Converte deslocamentos no código-fonte em linha e coluna (a partir de 1)
+    Tokens e nós guardam só deslocamentos; o índice com o início de cada
+    linha é montado na primeira consulta, e cada consulta é uma busca
+    binária nele. Programas sem erros nunca pagam por isso
+    """
+
+    __slots__ = ("fonte", "_inicios")
+
+    def __init__(self, fonte):
+        self.fonte = fonte
+        self._inicios = None
+
+    def inicios(self):
+        if self._inicios is None:
+            fonte = self.fonte
+            inicios = [0]
+            quebra = fonte.find("\n")
+            while quebra >= 0:
+                inicios.append(quebra + 1)
+                quebra = fonte.find("\n", quebra + 1)
+            self._inicios = inicios
+        return self._inicios
+
+    def linha_coluna(self, deslocamento):
+        inicios = self.inicios()
+        linha = bisect_right(inicios, deslocamento)
+        return linha, deslocamento - inicios[linha - 1] + 1
+
+    def descrever(self, deslocamento):
+        """
+        "Linha L, coluna C" do deslocamento, no formato dos diagnósticos
+        """
+        linha, coluna = self.linha_coluna(deslocamento)
+        return f"Linha {linha}, coluna {coluna}"
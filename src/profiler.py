@@ -0,0 +1,135 @@
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+FORMATOS = ("tabela", "json")
+
+
+class Perfil:
+    """
+    Tempo de parede, tempo de CPU e pico de memória (tracemalloc) de cada
+    etapa da compilação, mais contagens (tokens, nós, símbolos,
+    instruções...)
+    Etapas com o mesmo nome são somadas, como cada passe do otimizador, que
+    roda uma vez por fragmento; o pico é o maior entre as execuções, medido
+    acima da memória em uso no início da etapa. Etapas podem ser aninhadas.
+    Inativo, etapa() e contar() não fazem nada
+    """
+
+    def __init__(self, ativo=True):
+        self.ativo = ativo
+        self.etapas = {}
+        self.contagens = {}
+        self._pilha = []
+        self._iniciou_tracemalloc = False
+        if ativo and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._iniciou_tracemalloc = True
+
+    @contextmanager
+    def etapa(self, nome):
+        if not self.ativo:
+            yield
+            return
+
+        # O pico do tracemalloc é um só: o da etapa de fora é guardado antes
+        # de zerá-lo para esta e combinado de volta no fim
+        atual, pico = tracemalloc.get_traced_memory()
+        if self._pilha:
+            self._pilha[-1][1] = max(self._pilha[-1][1], pico)
+        tracemalloc.reset_peak()
+        quadro = [atual, atual]
+        self._pilha.append(quadro)
+
+        parede = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            cpu = time.process_time() - cpu
+            parede = time.perf_counter() - parede
+            self._pilha.pop()
+            pico = max(quadro[1], tracemalloc.get_traced_memory()[1])
+            if self._pilha:
+                self._pilha[-1][1] = max(self._pilha[-1][1], pico)
+
+            registro = self.etapas.get(nome)
+            if registro is None:
+                registro = self.etapas[nome] = {
+                    "chamadas": 0,
+                    "parede": 0.0,
+                    "cpu": 0.0,
+                    "pico": 0,
+                }
+            registro["chamadas"] += 1
+            registro["parede"] += parede
+            registro["cpu"] += cpu
+            registro["pico"] = max(registro["pico"], pico - quadro[0])
+
+    def contar(self, nome, valor):
+        if self.ativo:
+            self.contagens[nome] = valor
+
+    def encerrar(self):
+        if self._iniciou_tracemalloc:
+            tracemalloc.stop()
+            self._iniciou_tracemalloc = False
+
+    def imprimir(self, arquivo, formato="tabela", saida=None):
+        """
+        Relatório em tabela ou em linhas JSON (uma por etapa e uma com as
+        contagens), por padrão na saída de erro, para não se misturar à
+        saída do compilador
+        """
+        if not self.ativo:
+            return
+        saida = saida or sys.stderr
+        if formato == "json":
+            self._imprimir_json(arquivo, saida)
+        else:
+            self._imprimir_tabela(arquivo, saida)
+
+    def _imprimir_tabela(self, arquivo, saida):
+        largura = max([len("Etapa"), *(len(nome) for nome in self.etapas)])
+        linhas = [
+            "=" * 70,
+            f"PERFIL: {arquivo}",
+            "=" * 70,
+            f"{'Etapa':<{largura}} {'Vezes':>6} {'Parede (ms)':>12} "
+            f"{'CPU (ms)':>10} {'Pico (KiB)':>11}",
+            "-" * (largura + 43),
+        ]
+        for nome, registro in self.etapas.items():
+            linhas.append(
+                f"{nome:<{largura}} {registro['chamadas']:>6} "
+                f"{registro['parede'] * 1e3:>12.2f} {registro['cpu'] * 1e3:>10.2f} "
+                f"{registro['pico'] / 1024:>11.1f}"
+            )
+        linhas.append("-" * (largura + 43))
+        for nome, valor in self.contagens.items():
+            linhas.append(f"{nome}: {valor}")
+        linhas.append("=" * 70)
+        saida.write("\n".join(linhas) + "\n")
+
+    def _imprimir_json(self, arquivo, saida):
+        linhas = []
+        for nome, registro in self.etapas.items():
+            linhas.append(
+                {
+                    "arquivo": arquivo,
+                    "etapa": nome,
+                    "chamadas": registro["chamadas"],
+                    "parede_ms": round(registro["parede"] * 1e3, 3),
+                    "cpu_ms": round(registro["cpu"] * 1e3, 3),
+                    "pico_kib": round(registro["pico"] / 1024, 1),
+                }
+            )
+        linhas.append({"arquivo": arquivo, "contagens": self.contagens})
+        saida.write(
+            "".join(json.dumps(linha, ensure_ascii=False) + "\n" for linha in linhas)
+        )
+
+
+INATIVO = Perfil(ativo=False)
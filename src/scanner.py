@@ -0,0 +1,232 @@
+import re
+import sys
+from functools import partial
+
+from ply.lex import LexToken
+
+from lexer import TAMANHO_TRECHO, reserved, tokens, trechos_arquivo
+
+# Tipo de token = posição em lexer.tokens
+TIPOS = tokens
+TIPO = {nome: indice for indice, nome in enumerate(TIPOS)}
+
+ID = TIPO["ID"]
+NUMBER = TIPO["NUMBER"]
+STRING = TIPO["STRING"]
+COLON = TIPO["COLON"]
+ASSIGN = TIPO["ASSIGN"]
+DOT = TIPO["DOT"]
+
+# Classes de caractere: o primeiro caractere decide a regra a aplicar
+ERRO, ESPACO, QUEBRA, LETRA, DIGITO, PONTO, ASPAS, CHAVE, DOIS_PONTOS = range(9)
+SIMPLES = 9
+
+SIMBOLOS = {
+    "+": "PLUS",
+    "-": "MINUS",
+    "*": "TIMES",
+    "/": "DIVIDE",
+    ">": "GT",
+    "<": "LT",
+    "=": "EQUALS",
+    "!": "EXCLAMATION",
+    ";": "SEMICOLON",
+    ",": "COMMA",
+    "(": "LPAREN",
+    ")": "RPAREN",
+    "[": "LBRACKET",
+    "]": "RBRACKET",
+}
+
+
+def _montar_classes():
+    classes = {" ": ESPACO, "\t": ESPACO, "\n": QUEBRA}
+    for c in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ":
+        classes[c] = LETRA
+    for c in "0123456789":
+        classes[c] = DIGITO
+    classes["."] = PONTO
+    classes['"'] = ASPAS
+    classes["{"] = CHAVE
+    classes[":"] = DOIS_PONTOS
+    # Símbolos de um caractere: a classe já carrega o tipo do token
+    for c, nome in SIMBOLOS.items():
+        classes[c] = SIMPLES + TIPO[nome]
+    return classes
+
+
+CLASSES = _montar_classes()
+
+_ESPACOS = re.compile(r"[ \t]+")
+_QUEBRAS = re.compile(r"\n+")
+_IDENTIFICADOR = re.compile(r"[a-zA-Z][a-zA-Z0-9_]*")
+_NUMERO = re.compile(r"\d+\.?\d*|\d*\.\d+")
+
+# Grafia -> (tipo, texto internado); .lower() e a busca em reserved
+# acontecem uma vez por grafia, não uma vez por ocorrência
+_PALAVRAS = {}
+LIMITE_PALAVRAS = 1 << 16
+
+
+def _palavra(texto):
+    if len(_PALAVRAS) >= LIMITE_PALAVRAS:
+        _PALAVRAS.clear()
+    nome = reserved.get(texto.lower())
+    entrada = (TIPO[nome] if nome else ID, sys.intern(texto))
+    _PALAVRAS[texto] = entrada
+    return entrada
+
+
+def _erro(fonte, pos, linha, mensagens):
+    coluna = pos - fonte.rfind("\n", 0, pos)
+    mensagem = f"Caractere ilegal '{fonte[pos]}' na linha {linha}, coluna {coluna}"
+    if mensagens is None:
+        print(mensagem)
+    else:
+        mensagens.append(mensagem)
+
+
+def varrer(fonte, linha=1, base=0, mensagens=None):
+    """
+    Gera os tokens de fonte como tuplas (tipo, valor, linha, início,
+    comprimento): tipo é o índice do token em TIPOS, e início e comprimento
+    delimitam o lexema na entrada (início somado a base). O
+    resultado é, token a token, o mesmo do lexer PLY de lexer.py: cada
+    caractere é classificado pela tabela CLASSES, que escolhe a regra, e
+    sequências (espaços, identificadores, números) são consumidas por uma
+    única expressão ancorada. Erros léxicos têm a mesma mensagem do
+    t_error; com a lista mensagens, são guardados nela em vez de impressos
+    """
+    classes = CLASSES
+    palavras = _PALAVRAS
+    espacos = _ESPACOS.match
+    quebras = _QUEBRAS.match
+    identificador = _IDENTIFICADOR.match
+    numero = _NUMERO.match
+    pos = 0
+    fim = len(fonte)
+    while pos < fim:
+        c = fonte[pos]
+        classe = classes.get(c)
+        if classe is None:
+            # \d do PLY também aceita dígitos de outros alfabetos
+            classe = DIGITO if c.isdecimal() else ERRO
+
+        # Ramos na ordem da frequência típica: identificadores, espaços e
+        # símbolos de um caractere são a maior parte dos tokens
+        if classe == LETRA:
+            texto = identificador(fonte, pos).group()
+            entrada = palavras.get(texto) or _palavra(texto)
+            n = len(texto)
+            yield (entrada[0], entrada[1], linha, pos + base, n)
+            pos += n
+        elif classe == ESPACO:
+            pos = espacos(fonte, pos).end()
+        elif classe >= SIMPLES:
+            yield (classe - SIMPLES, c, linha, pos + base, 1)
+            pos += 1
+        elif classe == QUEBRA:
+            fim_quebras = quebras(fonte, pos).end()
+            linha += fim_quebras - pos
+            pos = fim_quebras
+        elif classe == DIGITO or classe == PONTO:
+            m = numero(fonte, pos)
+            if m is None:
+                yield (DOT, c, linha, pos + base, 1)
+                pos += 1
+            else:
+                texto = m.group()
+                valor = float(texto) if "." in texto else int(texto)
+                yield (NUMBER, valor, linha, pos + base, len(texto))
+                pos = m.end()
+        elif classe == DOIS_PONTOS:
+            if fonte.startswith("=", pos + 1):
+                yield (ASSIGN, ":=", linha, pos + base, 2)
+                pos += 2
+            else:
+                yield (COLON, c, linha, pos + base, 1)
+                pos += 1
+        elif classe == ASPAS or classe == CHAVE:
+            fecha = fonte.find('"' if classe == ASPAS else "}", pos + 1)
+            if fecha < 0:
+                # Sem fechamento, { e " são só caracteres ilegais
+                _erro(fonte, pos, linha, mensagens)
+                pos += 1
+            elif classe == ASPAS:
+                texto = fonte[pos + 1 : fecha]
+                yield (STRING, texto, linha, pos + base, fecha + 1 - pos)
+                linha += texto.count("\n")
+                pos = fecha + 1
+            else:
+                linha += fonte.count("\n", pos, fecha)
+                pos = fecha + 1
+        else:
+            _erro(fonte, pos, linha, mensagens)
+            pos += 1
+
+
+def varrer_arquivo(caminho, tamanho_trecho=TAMANHO_TRECHO):
+    """
+    varrer sobre um arquivo lido em trechos (ver lexer.trechos_arquivo),
+    com memória que não cresce com o arquivo
+    """
+    linha = 1
+    base = 0
+    for texto in trechos_arquivo(caminho, tamanho_trecho):
+        yield from varrer(texto, linha, base)
+        linha += texto.count("\n")
+        base += len(texto)
+
+
+def imprimir_tokens(itens):
+    """
+    Imprime tuplas de varrer no mesmo formato de lexer.print_tokens
+    """
+    print(f"{'Token':<20} {'Lexema':<20} {'Linha':<10}")
+    print("-" * 50)
+    for tipo, valor, linha, _, _ in itens:
+        print(f"{TIPOS[tipo]:<20} {str(valor):<20} {linha:<10}")
+
+
+def _lex_token(item):
+    tok = LexToken()
+    tok.type = TIPOS[item[0]]
+    tok.value, tok.lineno, tok.lexpos, tok.comprimento = item[1:]
+    return tok
+
+
+class BufferVarredura:
+    """
+    Equivalente a lexer.BufferTokens para o scanner deste módulo: guarda as
+    tuplas de varrer e as mensagens de erro na ordem em que aparecem
+    """
+
+    __slots__ = ("itens",)
+
+    def __init__(self, data):
+        mensagens = []
+        itens = []
+        for item in varrer(data, mensagens=mensagens):
+            if mensagens:
+                itens.extend(mensagens)
+                mensagens.clear()
+            itens.append(item)
+        itens.extend(mensagens)
+        self.itens = itens
+
+    def tokens(self):
+        """
+        Percorre as tuplas, imprimindo as mensagens de erro no caminho
+        """
+        for item in self.itens:
+            if isinstance(item, str):
+                print(item)
+            else:
+                yield item
+
+    def funcao_token(self):
+        """
+        tokenfunc do ply.yacc: os LexToken são criados só quando o parser
+        pede o próximo token
+        """
+        return partial(next, map(_lex_token, self.tokens()), None)
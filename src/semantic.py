@@ -1,3 +1,18 @@
+from ast_nodes import (
+    ARRAY,
+    ARRAY_ACCESS,
+    CHAMADA_FUNCAO,
+    FIELD_ACCESS,
+    IDENTIFICADOR,
+    NUMERO,
+    OP_ARIT,
+    OP_COMP,
+    RECORD,
+    TEXTO,
+    No,
+)
+from dispatch import tabela_de_despacho
+from posicoes import MapaLinhas
 from symbol_table import SymbolTable, Symbol
 
 
@@ -18,13 +33,19 @@ class SemanticAnalyzer:
         self.tabela = SymbolTable()
         self.erros = []
         self.funcao_atual = None
+        self.linhas = None
         self.tipos_basicos = {"INTEGER", "REAL", "BOOLEAN", "CHAR", "STRING"}
 
-    def analisar(self, ast):
+    def analisar(self, ast, fonte=None):
+        """
+        Com o código-fonte, os erros indicam linha e coluna do nó em que
+        foram encontrados
+        """
         if ast is None:
             return False
 
         self.erros = []
+        self.linhas = MapaLinhas(fonte) if fonte is not None else None
         self.tabela.limpar()
 
         try:
@@ -34,9 +55,9 @@ class SemanticAnalyzer:
 
         return len(self.erros) == 0
 
-    def adicionar_erro(self, mensagem, linha=None):
-        if linha:
-            self.erros.append(f"Linha {linha}: {mensagem}")
+    def adicionar_erro(self, mensagem, no=None):
+        if no is not None and no.inicio is not None and self.linhas is not None:
+            self.erros.append(f"{self.linhas.descrever(no.inicio)}: {mensagem}")
         else:
             self.erros.append(mensagem)
 
@@ -44,14 +65,13 @@ class SemanticAnalyzer:
         if no is None:
             return None
 
-        if isinstance(no, tuple) and len(no) > 0:
-            tipo_no = no[0]
-            metodo = f"visitar_{tipo_no.lower()}"
+        if isinstance(no, No):
+            metodo = self.DESPACHO[no.tag]
 
-            if hasattr(self, metodo):
-                return getattr(self, metodo)(no)
+            if metodo is not None:
+                return metodo(self, no)
             else:
-                for filho in no[1:]:
+                for filho in no.filhos():
                     self.visitar(filho)
                 return None
 
@@ -64,65 +84,61 @@ class SemanticAnalyzer:
             return no
 
     def visitar_programa(self, no):
-        _, nome, corpo = no
+        self.tabela.adicionar(no.nome, "programa", "void")
 
-        self.tabela.adicionar(nome, "programa", "void")
-
-        self.visitar(corpo)
+        self.visitar(no.corpo)
 
     def visitar_corpo(self, no):
-        _, def_const, def_tipos, def_var, lista_func, lista_comandos = no
-
-        if def_const:
-            self.visitar(def_const)
+        if no.def_const:
+            self.visitar(no.def_const)
 
-        if def_tipos:
-            self.visitar(def_tipos)
+        if no.def_tipos:
+            self.visitar(no.def_tipos)
 
-        if def_var:
-            self.visitar(def_var)
+        if no.def_var:
+            self.visitar(no.def_var)
 
-        if lista_func:
-            for funcao in lista_func:
+        if no.lista_func:
+            for funcao in no.lista_func:
                 self.visitar(funcao)
 
-        if lista_comandos:
-            for comando in lista_comandos:
+        if no.lista_comandos:
+            for comando in no.lista_comandos:
                 self.visitar(comando)
 
     def visitar_def_const(self, no):
-        _, lista_const = no
-        for constante in lista_const:
+        for constante in no.lista_const:
             self.visitar(constante)
 
     def visitar_constante(self, no):
-        _, nome, valor = no
+        nome = no.nome
 
         if self.tabela.existe_no_escopo_atual(nome):
             self.adicionar_erro(
-                f"Constante '{nome}' já declarada no escopo {self.tabela.escopo_atual}"
+                f"Constante '{nome}' já declarada no escopo {self.tabela.escopo_atual}",
+                no,
             )
             return
 
-        tipo = self.inferir_tipo_literal(valor)
+        tipo = self.inferir_tipo_literal(no.valor)
 
-        self.tabela.adicionar(nome, "constante", tipo, valor=valor)
+        self.tabela.adicionar(nome, "constante", tipo, valor=no.valor.valor)
 
     def visitar_def_tipos(self, no):
-        _, lista_tipos = no
-        for tipo in lista_tipos:
+        for tipo in no.lista_tipos:
             self.visitar(tipo)
 
     def visitar_tipo(self, no):
-        _, nome, tipo_dado = no
+        nome = no.nome
 
         if self.tabela.existe_no_escopo_atual(nome):
             self.adicionar_erro(
-                f"Tipo '{nome}' já declarado no escopo {self.tabela.escopo_atual}"
+                f"Tipo '{nome}' já declarado no escopo {self.tabela.escopo_atual}",
+                no,
             )
             return
 
-        tipo_info = self.processar_tipo_dado(tipo_dado)
+        tipo_info = self.processar_tipo_dado(no.tipo_dado, no)
 
         simbolo = self.tabela.adicionar(nome, "tipo", tipo_info["tipo"])
         if simbolo:
@@ -131,7 +147,7 @@ class SemanticAnalyzer:
             if "campos" in tipo_info:
                 simbolo.campos = tipo_info["campos"]
 
-    def processar_tipo_dado(self, tipo_dado):
+    def processar_tipo_dado(self, tipo_dado, no=None):
         if isinstance(tipo_dado, str):
             tipo_upper = tipo_dado.upper()
             if tipo_upper in self.tipos_basicos:
@@ -141,74 +157,76 @@ class SemanticAnalyzer:
                 if simbolo and simbolo.classificacao == "tipo":
                     return {"tipo": tipo_dado}
                 else:
-                    self.adicionar_erro(f"Tipo '{tipo_dado}' não declarado")
+                    self.adicionar_erro(f"Tipo '{tipo_dado}' não declarado", no)
                     return {"tipo": "unknown"}
 
-        elif isinstance(tipo_dado, tuple):
-            if tipo_dado[0] == "ARRAY":
-                _, tamanho, tipo_elem = tipo_dado
-                tipo_elem_info = self.processar_tipo_dado(tipo_elem)
+        elif isinstance(tipo_dado, No):
+            if tipo_dado.tag == ARRAY:
+                tipo_elem_info = self.processar_tipo_dado(
+                    tipo_dado.tipo_elemento, tipo_dado
+                )
                 return {
                     "tipo": "array",
                     "tipo_elemento": tipo_elem_info["tipo"],
-                    "dimensoes": [tamanho],
+                    "dimensoes": (tipo_dado.tamanho,),
                 }
 
-            elif tipo_dado[0] == "RECORD":
-                _, lista_var = tipo_dado
+            elif tipo_dado.tag == RECORD:
                 campos = {}
-                for var in lista_var:
-                    _, lista_id, tipo = var
-                    tipo_info = self.processar_tipo_dado(tipo)
-                    for id_nome in lista_id:
+                for var in tipo_dado.lista_var:
+                    tipo_info = self.processar_tipo_dado(var.tipo_dado, var)
+                    for id_nome in var.lista_id:
                         campos[id_nome] = tipo_info["tipo"]
                 return {"tipo": "record", "campos": campos}
 
         return {"tipo": "unknown"}
 
     def visitar_def_var(self, no):
-        _, lista_var = no
-        for var in lista_var:
+        for var in no.lista_var:
             self.visitar(var)
 
     def visitar_variavel(self, no):
-        _, lista_id, tipo_dado = no
+        lista_id = no.lista_id
+
+        tipo_info = self.processar_tipo_dado(no.tipo_dado, no)
+
+        atributos = {}
+        if "dimensoes" in tipo_info:
+            atributos["dimensoes"] = tipo_info["dimensoes"]
+            atributos["tipo_elemento"] = tipo_info["tipo_elemento"]
+        if "campos" in tipo_info:
+            atributos["campos"] = tipo_info["campos"]
 
-        tipo_info = self.processar_tipo_dado(tipo_dado)
+        simbolos = self.tabela.adicionar_varios(
+            lista_id, "variavel", tipo_info["tipo"], **atributos
+        )
 
-        for id_nome in lista_id:
-            if self.tabela.existe_no_escopo_atual(id_nome):
+        for id_nome, simbolo in zip(lista_id, simbolos):
+            if simbolo is None:
                 self.adicionar_erro(
-                    f"Variável '{id_nome}' já declarada no escopo {self.tabela.escopo_atual}"
+                    f"Variável '{id_nome}' já declarada no escopo {self.tabela.escopo_atual}",
+                    no,
                 )
-                continue
-
-            simbolo = self.tabela.adicionar(id_nome, "variavel", tipo_info["tipo"])
-            if simbolo:
-                if "dimensoes" in tipo_info:
-                    simbolo.dimensoes = tipo_info["dimensoes"]
-                if "campos" in tipo_info:
-                    simbolo.campos = tipo_info["campos"]
 
     def visitar_funcao(self, no):
-        _, nome, lista_param, tipo_retorno, def_var, lista_comandos = no
+        nome = no.nome
+        lista_param = no.lista_param
 
         if self.tabela.existe_no_escopo_atual(nome):
             self.adicionar_erro(
-                f"Função '{nome}' já declarada no escopo {self.tabela.escopo_atual}"
+                f"Função '{nome}' já declarada no escopo {self.tabela.escopo_atual}",
+                no,
             )
             return
 
-        tipo_ret_info = self.processar_tipo_dado(tipo_retorno)
+        tipo_ret_info = self.processar_tipo_dado(no.tipo_retorno, no)
 
         parametros = []
         if lista_param:
             for param in lista_param:
-                if param and param[0] == "PARAMETRO":
-                    _, lista_id, tipo_param = param
-                    tipo_param_info = self.processar_tipo_dado(tipo_param)
-                    for id_nome in lista_id:
-                        parametros.append((tipo_param_info["tipo"], id_nome))
+                tipo_param_info = self.processar_tipo_dado(param.tipo_dado, param)
+                for id_nome in param.lista_id:
+                    parametros.append((tipo_param_info["tipo"], id_nome))
 
         simbolo = self.tabela.adicionar(
             nome,
@@ -224,241 +242,279 @@ class SemanticAnalyzer:
         ordem = 1
         if lista_param:
             for param in lista_param:
-                if param and param[0] == "PARAMETRO":
-                    _, lista_id, tipo_param = param
-                    tipo_param_info = self.processar_tipo_dado(tipo_param)
-                    for id_nome in lista_id:
-                        self.tabela.adicionar(
-                            id_nome, "parametro", tipo_param_info["tipo"], ordem=ordem
-                        )
-                        ordem += 1
+                tipo_param_info = self.processar_tipo_dado(param.tipo_dado, param)
+                for id_nome in param.lista_id:
+                    self.tabela.adicionar(
+                        id_nome, "parametro", tipo_param_info["tipo"], ordem=ordem
+                    )
+                    ordem += 1
 
-        if def_var:
-            self.visitar(def_var)
+        if no.def_var:
+            self.visitar(no.def_var)
 
-        if lista_comandos:
-            for comando in lista_comandos:
+        if no.lista_comandos:
+            for comando in no.lista_comandos:
                 self.visitar(comando)
 
         self.tabela.sair_escopo()
         self.funcao_atual = None
 
     def visitar_atribuicao(self, no):
-        _, lvalue, expressao = no
-
-        tipo_lvalue = self.obter_tipo_lvalue(lvalue)
+        tipo_lvalue = self.obter_tipo_lvalue(no.lvalue)
 
-        tipo_expr = self.obter_tipo_expressao(expressao)
+        tipo_expr = self.obter_tipo_expressao(no.expressao)
 
         if tipo_lvalue and tipo_expr:
             if not self.tipos_compativeis(tipo_lvalue, tipo_expr):
                 self.adicionar_erro(
                     f"Tipos incompatíveis em atribuição: "
-                    f"não é possível atribuir {tipo_expr} a {tipo_lvalue}"
+                    f"não é possível atribuir {tipo_expr} a {tipo_lvalue}",
+                    no,
                 )
 
     def visitar_while(self, no):
-        _, condicao, lista_comandos = no
-
-        tipo_cond = self.obter_tipo_expressao(condicao)
+        tipo_cond = self.obter_tipo_expressao(no.condicao)
         if tipo_cond and tipo_cond != "boolean":
             self.adicionar_erro(
-                f"Condição de WHILE deve ser booleana, mas é {tipo_cond}"
+                f"Condição de WHILE deve ser booleana, mas é {tipo_cond}",
+                no.condicao,
             )
 
-        for comando in lista_comandos:
+        for comando in no.lista_comandos:
             self.visitar(comando)
 
     def visitar_if(self, no):
-        _, condicao, comandos_then, else_parte = no
-
-        tipo_cond = self.obter_tipo_expressao(condicao)
+        tipo_cond = self.obter_tipo_expressao(no.condicao)
         if tipo_cond and tipo_cond != "boolean":
-            self.adicionar_erro(f"Condição de IF deve ser booleana, mas é {tipo_cond}")
+            self.adicionar_erro(
+                f"Condição de IF deve ser booleana, mas é {tipo_cond}", no.condicao
+            )
 
-        for comando in comandos_then:
+        for comando in no.comandos_then:
             self.visitar(comando)
 
-        if else_parte:
-            _, comandos_else = else_parte
-            for comando in comandos_else:
+        if no.else_parte:
+            for comando in no.else_parte.lista_comandos:
                 self.visitar(comando)
 
     def visitar_write(self, no):
-        _, valor = no
-        if isinstance(valor, tuple):
-            self.obter_tipo_expressao(valor)
+        self.obter_tipo_expressao(no.valor)
 
     def visitar_read(self, no):
-        _, id_nome = no
+        id_nome = no.nome
 
         simbolo = self.tabela.buscar(id_nome)
         if not simbolo:
-            self.adicionar_erro(f"Variável '{id_nome}' não declarada")
+            self.adicionar_erro(f"Variável '{id_nome}' não declarada", no)
         elif simbolo.classificacao != "variavel":
-            self.adicionar_erro(f"'{id_nome}' não é uma variável")
+            self.adicionar_erro(f"'{id_nome}' não é uma variável", no)
 
     def obter_tipo_lvalue(self, lvalue):
-        if isinstance(lvalue, str):
-            simbolo = self.tabela.buscar(lvalue)
+        tag = lvalue.tag
+
+        if tag == IDENTIFICADOR:
+            nome = lvalue.nome
+            simbolo = self.tabela.buscar(nome)
             if not simbolo:
-                self.adicionar_erro(f"Identificador '{lvalue}' não declarado")
+                self.adicionar_erro(f"Identificador '{nome}' não declarado", lvalue)
                 return None
 
+            if simbolo.classificacao == "funcao" and nome == self.funcao_atual:
+                return simbolo.tipo_retorno
+
             if simbolo.classificacao not in ["variavel", "parametro"]:
                 self.adicionar_erro(
-                    f"'{lvalue}' não pode ser usado em atribuição (não é variável)"
+                    f"'{nome}' não pode ser usado em atribuição (não é variável)",
+                    lvalue,
                 )
                 return None
 
             return simbolo.tipo
 
-        elif isinstance(lvalue, tuple):
-            if lvalue[0] == "ARRAY_ACCESS":
-                _, id_nome, indice = lvalue
+        elif tag == ARRAY_ACCESS:
+            id_nome = lvalue.nome
 
-                simbolo = self.tabela.buscar(id_nome)
-                if not simbolo:
-                    self.adicionar_erro(f"Array '{id_nome}' não declarado")
-                    return None
+            simbolo = self.tabela.buscar(id_nome)
+            if not simbolo:
+                self.adicionar_erro(f"Array '{id_nome}' não declarado", lvalue)
+                return None
 
-                tipo_indice = self.obter_tipo_expressao(indice)
-                if tipo_indice and tipo_indice != "integer":
-                    self.adicionar_erro(
-                        f"Índice de array deve ser inteiro, mas é {tipo_indice}"
-                    )
+            tipo_indice = self.obter_tipo_expressao(lvalue.indice)
+            if tipo_indice and tipo_indice != "integer":
+                self.adicionar_erro(
+                    f"Índice de array deve ser inteiro, mas é {tipo_indice}",
+                    lvalue.indice,
+                )
 
-                return simbolo.tipo
+            return simbolo.tipo_elemento or simbolo.tipo
 
-            elif lvalue[0] == "FIELD_ACCESS":
-                _, id_base, campo = lvalue
+        elif tag == FIELD_ACCESS:
+            id_base, campo = lvalue.base, lvalue.campo
 
-                if isinstance(id_base, str):
-                    simbolo = self.tabela.buscar(id_base)
-                    if not simbolo:
-                        self.adicionar_erro(f"Registro '{id_base}' não declarado")
-                        return None
+            if isinstance(id_base, str):
+                simbolo = self.tabela.buscar(id_base)
+                if not simbolo:
+                    self.adicionar_erro(f"Registro '{id_base}' não declarado", lvalue)
+                    return None
 
-                    if simbolo.campos and campo in simbolo.campos:
-                        return simbolo.campos[campo]
-                    else:
-                        self.adicionar_erro(f"Campo '{campo}' não existe no registro")
-                        return None
+                if simbolo.campos and campo in simbolo.campos:
+                    return simbolo.campos[campo]
+                else:
+                    self.adicionar_erro(
+                        f"Campo '{campo}' não existe no registro", lvalue
+                    )
+                    return None
 
         return None
 
     def obter_tipo_expressao(self, expr):
+        """
+        Tipo de uma expressão, registrando os erros encontrados
+        Percorre a árvore em pós-ordem com pilha explícita (quadros
+        (nó, etapa, símbolo)), na mesma ordem em que uma descida recursiva
+        reportaria os erros, sem limite de profundidade
+        """
         if expr is None:
             return None
 
-        if isinstance(expr, (int, float)):
-            return "integer" if isinstance(expr, int) else "real"
+        tipos = []
+        pilha = [(expr, 0, None)]
 
-        if isinstance(expr, str):
-            if expr.startswith('"') or expr.startswith("'"):
-                return "string"
+        while pilha:
+            no, etapa, simbolo = pilha.pop()
+            tag = no.tag
 
-            simbolo = self.tabela.buscar(expr)
-            if not simbolo:
-                self.adicionar_erro(f"Identificador '{expr}' não declarado")
-                return None
-            return simbolo.tipo
+            if tag == NUMERO:
+                tipos.append("integer" if isinstance(no.valor, int) else "real")
+
+            elif tag == TEXTO:
+                tipos.append("string")
+
+            elif tag == IDENTIFICADOR:
+                simbolo = self.tabela.buscar(no.nome)
+                if not simbolo:
+                    self.adicionar_erro(f"Identificador '{no.nome}' não declarado", no)
+                    tipos.append(None)
+                else:
+                    tipos.append(simbolo.tipo)
 
-        if isinstance(expr, tuple):
-            if expr[0] == "OP_ARIT":
-                _, op, esq, dir = expr
-                tipo_esq = self.obter_tipo_expressao(esq)
-                tipo_dir = self.obter_tipo_expressao(dir)
+            elif tag == OP_ARIT or tag == OP_COMP:
+                if etapa == 0:
+                    pilha.append((no, 1, None))
+                    pilha.append((no.dir, 0, None))
+                    pilha.append((no.esq, 0, None))
+                    continue
 
+                tipo_dir = tipos.pop()
+                tipo_esq = tipos.pop()
+
+                if tag == OP_COMP:
+                    tipos.append("boolean")
+                    continue
+
+                op = no.op
                 if tipo_esq and tipo_esq not in ["integer", "real"]:
                     self.adicionar_erro(
-                        f"Operando esquerdo de {op} deve ser numérico, mas é {tipo_esq}"
+                        f"Operando esquerdo de {op} deve ser numérico, mas é {tipo_esq}",
+                        no.esq,
                     )
                 if tipo_dir and tipo_dir not in ["integer", "real"]:
                     self.adicionar_erro(
-                        f"Operando direito de {op} deve ser numérico, mas é {tipo_dir}"
+                        f"Operando direito de {op} deve ser numérico, mas é {tipo_dir}",
+                        no.dir,
                     )
 
                 if tipo_esq == "real" or tipo_dir == "real":
-                    return "real"
-                return "integer"
+                    tipos.append("real")
+                else:
+                    tipos.append("integer")
 
-            elif expr[0] == "OP_COMP":
-                _, op, esq, dir = expr
-                tipo_esq = self.obter_tipo_expressao(esq)
-                tipo_dir = self.obter_tipo_expressao(dir)
+            elif tag == ARRAY_ACCESS:
+                if etapa == 0:
+                    simbolo = self.tabela.buscar(no.nome)
+                    if not simbolo:
+                        self.adicionar_erro(f"Array '{no.nome}' não declarado", no)
+                        tipos.append(None)
+                        continue
 
-                return "boolean"
+                    pilha.append((no, 1, simbolo))
+                    pilha.append((no.indice, 0, None))
+                    continue
 
-            elif expr[0] == "ARRAY_ACCESS":
-                _, id_nome, indice = expr
-                simbolo = self.tabela.buscar(id_nome)
-                if not simbolo:
-                    self.adicionar_erro(f"Array '{id_nome}' não declarado")
-                    return None
-
-                tipo_indice = self.obter_tipo_expressao(indice)
+                tipo_indice = tipos.pop()
                 if tipo_indice and tipo_indice != "integer":
                     self.adicionar_erro(
-                        f"Índice de array deve ser inteiro, mas é {tipo_indice}"
+                        f"Índice de array deve ser inteiro, mas é {tipo_indice}",
+                        no.indice,
                     )
 
-                return simbolo.tipo
+                tipos.append(simbolo.tipo_elemento or simbolo.tipo)
 
-            elif expr[0] == "FIELD_ACCESS":
-                _, id_base, campo = expr
+            elif tag == FIELD_ACCESS:
+                id_base, campo = no.base, no.campo
                 simbolo = self.tabela.buscar(id_base)
                 if not simbolo:
-                    self.adicionar_erro(f"Registro '{id_base}' não declarado")
-                    return None
-
-                if simbolo.campos and campo in simbolo.campos:
-                    return simbolo.campos[campo]
+                    self.adicionar_erro(f"Registro '{id_base}' não declarado", no)
+                    tipos.append(None)
+                elif simbolo.campos and campo in simbolo.campos:
+                    tipos.append(simbolo.campos[campo])
                 else:
-                    self.adicionar_erro(f"Campo '{campo}' não existe")
-                    return None
-
-            elif expr[0] == "CHAMADA_FUNCAO":
-                _, nome, args = expr
-
-                simbolo = self.tabela.buscar(nome)
-                if not simbolo:
-                    self.adicionar_erro(f"Função '{nome}' não declarada")
-                    return None
+                    self.adicionar_erro(f"Campo '{campo}' não existe", no)
+                    tipos.append(None)
 
-                if simbolo.classificacao != "funcao":
-                    self.adicionar_erro(f"'{nome}' não é uma função")
-                    return None
-
-                qtd_esperada = len(simbolo.parametros)
-                qtd_recebida = len(args)
-                if qtd_esperada != qtd_recebida:
-                    self.adicionar_erro(
-                        f"Função '{nome}' espera {qtd_esperada} argumentos, "
-                        f"mas recebeu {qtd_recebida}"
-                    )
+            elif tag == CHAMADA_FUNCAO:
+                nome, args = no.nome, no.args
 
-                for i, (arg, (tipo_param, _)) in enumerate(
-                    zip(args, simbolo.parametros), 1
-                ):
-                    tipo_arg = self.obter_tipo_expressao(arg)
+                if etapa == 0:
+                    simbolo = self.tabela.buscar(nome)
+                    if not simbolo:
+                        self.adicionar_erro(f"Função '{nome}' não declarada", no)
+                        tipos.append(None)
+                        continue
+
+                    if simbolo.classificacao != "funcao":
+                        self.adicionar_erro(f"'{nome}' não é uma função", no)
+                        tipos.append(None)
+                        continue
+
+                    qtd_esperada = len(simbolo.parametros)
+                    qtd_recebida = len(args)
+                    if qtd_esperada != qtd_recebida:
+                        self.adicionar_erro(
+                            f"Função '{nome}' espera {qtd_esperada} argumentos, "
+                            f"mas recebeu {qtd_recebida}",
+                            no,
+                        )
+                else:
+                    # etapa i: o argumento i acabou de ser avaliado
+                    tipo_param = simbolo.parametros[etapa - 1][0]
+                    tipo_arg = tipos.pop()
                     if tipo_arg and not self.tipos_compativeis(tipo_param, tipo_arg):
                         self.adicionar_erro(
-                            f"Argumento {i} de '{nome}' incompatível: "
-                            f"esperado {tipo_param}, recebido {tipo_arg}"
+                            f"Argumento {etapa} de '{nome}' incompatível: "
+                            f"esperado {tipo_param}, recebido {tipo_arg}",
+                            args[etapa - 1],
                         )
 
-                return simbolo.tipo_retorno
+                if etapa < min(len(args), len(simbolo.parametros)):
+                    pilha.append((no, etapa + 1, simbolo))
+                    pilha.append((args[etapa], 0, None))
+                    continue
 
-        return None
+                tipos.append(simbolo.tipo_retorno)
+
+            else:
+                tipos.append(None)
+
+        return tipos.pop()
 
-    def inferir_tipo_literal(self, valor):
-        if isinstance(valor, int):
+    def inferir_tipo_literal(self, literal):
+        if literal.tag == TEXTO:
+            return "string"
+        elif isinstance(literal.valor, int):
             return "integer"
-        elif isinstance(valor, float):
+        elif isinstance(literal.valor, float):
             return "real"
-        elif isinstance(valor, str):
-            return "string"
         return "unknown"
 
     def tipos_compativeis(self, tipo_destino, tipo_origem):
@@ -483,13 +539,18 @@ class SemanticAnalyzer:
         print(self.tabela)
 
 
-def analisar_semantica(ast, verbose=False):
+SemanticAnalyzer.DESPACHO = tabela_de_despacho(SemanticAnalyzer, "visitar_")
+
+
+def analisar_semantica(ast, verbose=False, fonte=None):
     analisador = SemanticAnalyzer()
-    sucesso = analisador.analisar(ast)
+    sucesso = analisador.analisar(ast, fonte)
 
     if verbose:
         analisador.imprimir_tabela()
 
-    analisador.imprimir_erros()
+    # Sem verbose, só os erros; "nenhum erro" é ruído na saída de -run
+    if verbose or analisador.erros:
+        analisador.imprimir_erros()
 
     return sucesso, analisador
@@ -1,81 +1,147 @@
+from collections import ChainMap
+from types import MappingProxyType
+
+
+# Contêineres vazios compartilhados por todos os símbolos; atributos que
+# precisam de conteúdo recebem um objeto próprio na atribuição
+SEM_PARAMETROS = ()
+SEM_DIMENSOES = ()
+SEM_CAMPOS = MappingProxyType({})
+
+
 class Symbol:
+    __slots__ = (
+        "nome",
+        "classificacao",
+        "tipo",
+        "escopo",
+        "linha",
+        "parametros",
+        "tipo_retorno",
+        "ordem",
+        "dimensoes",
+        "tipo_elemento",
+        "campos",
+        "valor",
+    )
+
     def __init__(self, nome, classificacao, tipo=None, escopo="global", linha=None):
         self.nome = nome
-        self.classificacao = (
-            classificacao
-        )
-        self.tipo = tipo 
-        self.escopo = escopo  
-        self.linha = linha  
+        self.classificacao = classificacao
+        self.tipo = tipo
+        self.escopo = escopo
+        self.linha = linha
 
-        self.parametros = []  
-        self.tipo_retorno = None  
+        self.parametros = SEM_PARAMETROS
+        self.tipo_retorno = None
 
-        self.ordem = None  
+        self.ordem = None
 
-        self.dimensoes = []  
+        self.dimensoes = SEM_DIMENSOES
+        self.tipo_elemento = None
 
-        self.campos = {}  
+        self.campos = SEM_CAMPOS
 
         self.valor = None
 
     def __repr__(self):
         return f"Symbol({self.nome}, {self.classificacao}, {self.tipo}, {self.escopo})"
 
+    def __getstate__(self):
+        # SEM_CAMPOS (MappingProxyType) não é serializável pelo pickle; vai
+        # como None e volta a ser o objeto compartilhado
+        estado = {nome: getattr(self, nome) for nome in self.__slots__}
+        if estado["campos"] is SEM_CAMPOS:
+            estado["campos"] = None
+        return estado
+
+    def __setstate__(self, estado):
+        for nome, valor in estado.items():
+            setattr(self, nome, valor)
+        if self.campos is None:
+            self.campos = SEM_CAMPOS
+
+
+ATRIBUTOS_SIMBOLO = frozenset(Symbol.__slots__)
+
 
 class SymbolTable:
+    """
+    Tabela de símbolos com um dicionário por escopo
+    Os escopos abertos formam uma cadeia (ChainMap) do mais interno para o
+    global, então buscar consulta um dicionário por nível aberto e listar um
+    escopo percorre só os seus próprios símbolos
+    """
+
     def __init__(self):
-        self.symbols = {} 
-        self.escopo_atual = "global"
-        self.escopos = ["global"]
+        self.limpar()
 
     def entrar_escopo(self, nome_escopo):
+        tabela = self.tabelas.setdefault(nome_escopo, {})
         self.escopos.append(nome_escopo)
         self.escopo_atual = nome_escopo
+        self.visiveis = self.visiveis.new_child(tabela)
 
     def sair_escopo(self):
         if len(self.escopos) > 1:
             self.escopos.pop()
             self.escopo_atual = self.escopos[-1]
+            self.visiveis = self.visiveis.parents
 
     def adicionar(self, nome, classificacao, tipo=None, linha=None, **kwargs):
-        if self.existe_no_escopo_atual(nome):
+        tabela = self.visiveis.maps[0]
+        if nome in tabela:
             return None
 
         simbolo = Symbol(nome, classificacao, tipo, self.escopo_atual, linha)
 
         for key, value in kwargs.items():
-            if hasattr(simbolo, key):
+            if key in ATRIBUTOS_SIMBOLO:
                 setattr(simbolo, key, value)
 
-        if nome not in self.symbols:
-            self.symbols[nome] = []
-        self.symbols[nome].append(simbolo)
+        tabela[nome] = simbolo
 
         return simbolo
 
-    def buscar(self, nome, escopo=None):
-        if nome not in self.symbols:
-            return None
+    def adicionar_varios(self, nomes, classificacao, tipo=None, linha=None, **kwargs):
+        """
+        Declara de uma vez um grupo de nomes com os mesmos atributos
+        (a, b, c : integer). Devolve um símbolo por nome, na ordem dada,
+        com None para os nomes já declarados no escopo atual
+        """
+        tabela = self.visiveis.maps[0]
+        escopo = self.escopo_atual
+        atributos = [
+            (key, value) for key, value in kwargs.items() if key in ATRIBUTOS_SIMBOLO
+        ]
+
+        simbolos = []
+        for nome in nomes:
+            if nome in tabela:
+                simbolos.append(None)
+                continue
+
+            simbolo = Symbol(nome, classificacao, tipo, escopo, linha)
+            for key, value in atributos:
+                setattr(simbolo, key, value)
 
-        if escopo is not None:
-            for simbolo in self.symbols[nome]:
-                if simbolo.escopo == escopo:
-                    return simbolo
-            return None
+            tabela[nome] = simbolo
+            simbolos.append(simbolo)
+
+        return simbolos
 
-        for escopo_busca in reversed(self.escopos):
-            for simbolo in self.symbols[nome]:
-                if simbolo.escopo == escopo_busca:
-                    return simbolo
+    def buscar(self, nome, escopo=None):
+        if escopo is not None:
+            tabela = self.tabelas.get(escopo)
+            return tabela.get(nome) if tabela is not None else None
 
-        return None
+        return self.visiveis.get(nome)
 
     def existe(self, nome):
         return self.buscar(nome) is not None
 
     def existe_no_escopo_atual(self, nome):
-        return self.buscar(nome, self.escopo_atual) is not None
+        return nome in self.visiveis.maps[0]
 
     def atualizar(self, nome, **kwargs):
         simbolo = self.buscar(nome)
@@ -83,7 +149,7 @@ class SymbolTable:
             return False
 
         for key, value in kwargs.items():
-            if hasattr(simbolo, key):
+            if key in ATRIBUTOS_SIMBOLO:
                 setattr(simbolo, key, value)
 
         return True
@@ -92,17 +158,13 @@ class SymbolTable:
         if escopo is None:
             escopo = self.escopo_atual
 
-        resultado = []
-        for lista_simbolos in self.symbols.values():
-            for simbolo in lista_simbolos:
-                if simbolo.escopo == escopo:
-                    resultado.append(simbolo)
-        return resultado
+        return list(self.tabelas.get(escopo, {}).values())
 
     def limpar(self):
-        self.symbols = {}
+        self.tabelas = {"global": {}}
         self.escopo_atual = "global"
         self.escopos = ["global"]
+        self.visiveis = ChainMap(self.tabelas["global"])
 
     def __repr__(self):
         linhas = ["Tabela de Símbolos:"]
@@ -113,8 +175,8 @@ class SymbolTable:
         linhas.append("-" * 100)
 
         todos_simbolos = []
-        for lista in self.symbols.values():
-            todos_simbolos.extend(lista)
+        for tabela in self.tabelas.values():
+            todos_simbolos.extend(tabela.values())
         todos_simbolos.sort(key=lambda s: (s.escopo, s.nome))
 
         for simbolo in todos_simbolos:
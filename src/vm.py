@@ -0,0 +1,353 @@
+import sys
+
+from code_generator import (
+    OPS_BINARIAS,
+    avaliar_operacao,
+    eh_composto,
+    eh_temporario,
+)
+from cfg import regioes
+from operands import Const, Field, Index, Var
+
+
+class ErroExecucao(Exception):
+    def __init__(self, message, instrucao=None):
+        self.message = message
+        self.instrucao = instrucao
+        super().__init__(self.format_message())
+
+    def format_message(self):
+        if self.instrucao is not None:
+            return f"Instrução {self.instrucao}: {self.message}"
+        return self.message
+
+
+# Códigos de operação internos da máquina; a ordem segue a frequência
+# esperada no laço de despacho
+MOV = 0
+ADD = 1
+SUB = 2
+MUL = 3
+JNZ = 4
+JMP = 5
+LES = 6
+GTR = 7
+EQL = 8
+NEQ = 9
+DIV = 10
+CARREGA = 11
+GUARDA = 12
+PUSH = 13
+POP = 14
+CALL = 15
+RET = 16
+WRITE = 17
+READ = 18
+
+OPCODES = {
+    "MOV": MOV,
+    "ADD": ADD,
+    "SUB": SUB,
+    "MUL": MUL,
+    "DIV": DIV,
+    "GTR": GTR,
+    "LES": LES,
+    "EQL": EQL,
+    "NEQ": NEQ,
+}
+
+
+class Programa:
+    """
+    Código intermediário pré-decodificado para a máquina virtual
+    Rótulos viram deslocamentos inteiros e cada operando vira o índice de
+    uma posição de memória; literais ocupam posições pré-carregadas, então
+    o laço de execução nunca distingue variável de constante
+    """
+
+    def __init__(self, instructions, tabela=None):
+        self.slots = {}
+        self.memoria_inicial = []
+        self.codigo = []
+        self.origem = []
+        self.funcoes = {}
+        self.locais = {}
+        self.inicio = 0
+
+        self._decodificar(instructions, tabela)
+
+    def slot(self, nome):
+        indice = self.slots.get(nome)
+        if indice is None:
+            indice = len(self.memoria_inicial)
+            self.slots[nome] = indice
+            self.memoria_inicial.append(0)
+        return indice
+
+    def constante(self, valor):
+        chave = (type(valor), valor)
+        indice = self.slots.get(chave)
+        if indice is None:
+            indice = len(self.memoria_inicial)
+            self.slots[chave] = indice
+            self.memoria_inicial.append(valor)
+        return indice
+
+    def _decodificar(self, instructions, tabela):
+        def operando(addr):
+            if eh_composto(addr):
+                raise ErroExecucao(f"operando composto não suportado: {addr}")
+            if isinstance(addr, Const):
+                return self.constante(addr.valor)
+            return self.slot(addr)
+
+        def endereco(addr):
+            """
+            (base, índice, campo) de a[i], r.campo ou a[i].campo
+            """
+            campo = None
+            if isinstance(addr, Field):
+                campo = addr.campo
+                addr = addr.base
+            if isinstance(addr, Index):
+                return self.slot(addr.base), operando(addr.indice), campo
+            return self.slot(addr), None, campo
+
+        rotulos = {}
+        pendentes = []
+        posicoes = {}
+
+        for i, instr in enumerate(instructions):
+            op = instr.op
+            posicoes[i] = len(self.codigo)
+
+            if op == "LBL":
+                rotulos[instr.addr1] = len(self.codigo)
+                if str(instr.addr1).startswith("FUNC_"):
+                    self.funcoes[str(instr.addr1)[len("FUNC_"):]] = len(self.codigo)
+                continue
+
+            if op == "MOV":
+                if eh_composto(instr.addr1):
+                    base, indice, campo = endereco(instr.addr1)
+                    decodificada = (GUARDA, base, indice, campo, operando(instr.addr2))
+                elif eh_composto(instr.addr2):
+                    base, indice, campo = endereco(instr.addr2)
+                    decodificada = (CARREGA, operando(instr.addr1), base, indice, campo)
+                else:
+                    decodificada = (MOV, operando(instr.addr1), operando(instr.addr2))
+            elif op in OPS_BINARIAS:
+                decodificada = (
+                    OPCODES[op],
+                    operando(instr.addr1),
+                    operando(instr.addr2),
+                    operando(instr.addr3),
+                )
+            elif op in {"JMP", "JNZ"}:
+                pendentes.append((len(self.codigo), instr.addr1))
+                if op == "JMP":
+                    decodificada = (JMP, None)
+                else:
+                    decodificada = (JNZ, None, operando(instr.addr2))
+            elif op == "CALL":
+                decodificada = (CALL, str(instr.addr1))
+            elif op == "RET":
+                decodificada = (RET,)
+            elif op == "PUSH":
+                decodificada = (PUSH, operando(instr.addr1))
+            elif op == "POP":
+                decodificada = (POP, operando(instr.addr1))
+            elif op == "READ":
+                decodificada = (READ, operando(instr.addr1))
+            elif op == "WRITE":
+                decodificada = (WRITE, operando(instr.addr1))
+            else:
+                raise ErroExecucao(f"operação desconhecida: {op}", i + 1)
+
+            self.codigo.append(decodificada)
+            self.origem.append(i + 1)
+
+        for posicao, rotulo in pendentes:
+            if rotulo not in rotulos:
+                raise ErroExecucao(f"rótulo inexistente: {rotulo}", self.origem[posicao])
+            instr = self.codigo[posicao]
+            self.codigo[posicao] = (instr[0], rotulos[rotulo]) + instr[2:]
+
+        for posicao, instr in enumerate(self.codigo):
+            if instr[0] == CALL:
+                if instr[1] not in self.funcoes:
+                    raise ErroExecucao(
+                        f"função inexistente: {instr[1]}", self.origem[posicao]
+                    )
+                self.codigo[posicao] = (CALL, self.funcoes[instr[1]], instr[1])
+
+        posicoes[len(instructions)] = len(self.codigo)
+        for nome, inicio, fim in regioes(instructions):
+            if nome is None:
+                self.inicio = posicoes[inicio]
+                continue
+
+            # Locais: parâmetros (os POP logo após o rótulo), temporários e
+            # símbolos do escopo da função. Outros POP podem gravar em
+            # globais (coalescer_temporarios troca POP TEMP; MOV b TEMP
+            # por POP b), e restaurá-los no RET desfaria a escrita
+            locais = set()
+            entrada = True
+            for instr in instructions[inicio + 1 : fim]:
+                entrada = entrada and instr.op == "POP"
+                dest = instr.destino()
+                if entrada or eh_temporario(dest):
+                    locais.add(dest)
+            if tabela is not None:
+                for simbolo in tabela.obter_todos_no_escopo(nome):
+                    locais.add(Var(simbolo.nome))
+            self.locais[posicoes[inicio]] = tuple(
+                sorted(self.slot(local) for local in locais)
+            )
+
+
+class VM:
+    """
+    Máquina virtual para o código de três endereços
+    Valores simples ocupam posições de uma lista; arrays e registros são
+    dicionários criados no primeiro acesso. Cada CALL salva as variáveis
+    locais da função chamada, o que permite recursão
+    """
+
+    def __init__(self, entrada=None, saida=None):
+        self.entrada = entrada if entrada is not None else sys.stdin
+        self.saida = saida if saida is not None else sys.stdout
+        self.executadas = 0
+
+    def executar(self, programa):
+        codigo = programa.codigo
+        memoria = list(programa.memoria_inicial)
+        locais = programa.locais
+        pilha = []
+        chamadas = []
+        escrever = self.saida.write
+        n = len(codigo)
+        pc = programa.inicio
+        executadas = 0
+
+        while pc < n:
+            instr = codigo[pc]
+            op = instr[0]
+            pc += 1
+            executadas += 1
+
+            if op == MOV:
+                memoria[instr[1]] = memoria[instr[2]]
+            elif op == ADD:
+                memoria[instr[1]] = memoria[instr[2]] + memoria[instr[3]]
+            elif op == SUB:
+                memoria[instr[1]] = memoria[instr[2]] - memoria[instr[3]]
+            elif op == MUL:
+                memoria[instr[1]] = memoria[instr[2]] * memoria[instr[3]]
+            elif op == JNZ:
+                if memoria[instr[2]]:
+                    pc = instr[1]
+            elif op == JMP:
+                pc = instr[1]
+            elif op == LES:
+                memoria[instr[1]] = 1 if memoria[instr[2]] < memoria[instr[3]] else 0
+            elif op == GTR:
+                memoria[instr[1]] = 1 if memoria[instr[2]] > memoria[instr[3]] else 0
+            elif op == EQL:
+                memoria[instr[1]] = 1 if memoria[instr[2]] == memoria[instr[3]] else 0
+            elif op == NEQ:
+                memoria[instr[1]] = 1 if memoria[instr[2]] != memoria[instr[3]] else 0
+            elif op == DIV:
+                try:
+                    memoria[instr[1]] = avaliar_operacao(
+                        "DIV", memoria[instr[2]], memoria[instr[3]]
+                    )
+                except ZeroDivisionError:
+                    raise ErroExecucao("divisão por zero", programa.origem[pc - 1])
+            elif op == CARREGA:
+                _, dest, base, indice, campo = instr
+                valor = memoria[base]
+                if indice is not None:
+                    valor = valor.get(memoria[indice], 0) if valor else 0
+                if campo is not None:
+                    valor = valor.get(campo, 0) if valor else 0
+                memoria[dest] = valor
+            elif op == GUARDA:
+                _, base, indice, campo, origem = instr
+                if not isinstance(memoria[base], dict):
+                    memoria[base] = {}
+                alvo = memoria[base]
+                if indice is not None and campo is not None:
+                    chave = memoria[indice]
+                    if not isinstance(alvo.get(chave), dict):
+                        alvo[chave] = {}
+                    alvo = alvo[chave]
+                    alvo[campo] = memoria[origem]
+                elif indice is not None:
+                    alvo[memoria[indice]] = memoria[origem]
+                else:
+                    alvo[campo] = memoria[origem]
+            elif op == PUSH:
+                pilha.append(memoria[instr[1]])
+            elif op == POP:
+                if not pilha:
+                    raise ErroExecucao("pilha vazia", programa.origem[pc - 1])
+                memoria[instr[1]] = pilha.pop()
+            elif op == CALL:
+                destino = instr[1]
+                slots = locais.get(destino, ())
+                chamadas.append((pc, slots, [memoria[s] for s in slots]))
+                for s in slots:
+                    memoria[s] = 0
+                pc = destino
+            elif op == RET:
+                if not chamadas:
+                    break
+                pc, slots, salvos = chamadas.pop()
+                for s, valor in zip(slots, salvos):
+                    memoria[s] = valor
+            elif op == WRITE:
+                try:
+                    texto = str(memoria[instr[1]])
+                except ValueError:
+                    # Inteiros acima do limite de dígitos de str(int)
+                    raise ErroExecucao(
+                        "valor grande demais para escrever",
+                        programa.origem[pc - 1],
+                    )
+                escrever(f"{texto}\n")
+            elif op == READ:
+                linha = self.entrada.readline()
+                if not linha:
+                    raise ErroExecucao(
+                        "fim da entrada durante READ", programa.origem[pc - 1]
+                    )
+                memoria[instr[1]] = _ler_numero(linha.strip())
+
+        self.executadas = executadas
+        return memoria
+
+
+def _ler_numero(texto):
+    try:
+        return int(texto)
+    except ValueError:
+        pass
+    try:
+        return float(texto)
+    except ValueError:
+        raise ErroExecucao(f"valor numérico inválido: '{texto}'")
+
+
+def executar_codigo(instructions, tabela=None, verbose=True):
+    programa = Programa(instructions, tabela)
+    vm = VM()
+    vm.executar(programa)
+
+    if verbose:
+        print()
+        print("=" * 70)
+        print(f"Instruções executadas: {vm.executadas}")
+        print("=" * 70)
+
+    return vm